@@ -6,9 +6,18 @@ import sys
 import traceback
 import requests
 from datetime import datetime
-from flask import Flask, jsonify, request, send_from_directory
+from flask import Flask, Response, jsonify, request, send_file, send_from_directory, abort
+from werkzeug.utils import safe_join
 from flask_cors import CORS
-from database import NewsDatabase
+from database import NewsDatabase, ndjson_path
+from article_snapshot import ArticleSnapshot
+from pagination import encode_cursor, next_page_cursor, decode_cursor, encode_offset_cursor, decode_offset_cursor, InvalidCursor
+from circuit_breaker import CircuitBreaker
+import image_queue
+import image_store
+import image_variants
+import precompress
+import export_shards
 from apscheduler.schedulers.background import BackgroundScheduler
 import subprocess
 import logging
@@ -35,6 +44,31 @@ CORS(app)  # Enable CORS for all routes
 # Initialize database
 db = NewsDatabase()
 
+# Articles from the JSON export, loaded once and reloaded when the export changes
+articles_snapshot = ArticleSnapshot('gaming_news.json', db)
+
+# Snapshots of the per-source export shards, by source slug
+source_snapshots = {}
+
+def get_source_snapshot(source):
+    """Snapshot of a source's export shard, or None if there is no shard for it"""
+    slug = export_shards.source_slug(source)
+    snapshot = source_snapshots.get(slug)
+    if snapshot is None:
+        # Only sources with a shard on disk are cached, so arbitrary ?source=
+        # values can't grow the cache
+        path = export_shards.source_shard_path(source)
+        if not os.path.exists(path):
+            return None
+        snapshot = source_snapshots.setdefault(slug, ArticleSnapshot(path))
+    return snapshot.get()
+
+# Per-source circuit breaker, persisted in the database
+breaker = CircuitBreaker(db)
+
+# Scraping engine used by run_scraper: 'sequential' (one source at a time) or 'async'
+SCRAPER_ENGINE = os.environ.get('SCRAPER_ENGINE', 'sequential')
+
 # Function to run the scraper
 def run_scraper():
     logger.info("Starting scheduled scraping job")
@@ -49,6 +83,8 @@ def run_scraper():
     except Exception as e:
         logger.error(f"Internet connectivity test failed: {str(e)}")
     
+    # This run's background image downloads; overlapping runs each have their own
+    downloads = None
     try:
         # Import the scraper modules directly
         from scraper import clear_data
@@ -84,49 +120,121 @@ def run_scraper():
         success_count = 0
         error_count = 0
         
+        # Transient fetch failures are retried per request inside http_client,
+        # within a retry budget shared by the whole run
+        import http_client
+        http_client.reset_retry_budget()
+        
+        # Download images on a background pool while articles are parsed;
+        # each result is written to the database as soon as it completes
+        downloads = image_queue.ImageDownloadQueue()
+        downloads.add_listener(lambda article: db.update_article_image(
+            article['source_url'], article['local_image_path'], article['image_status']))
+        for scraper in scrapers.values():
+            scraper.image_queue = downloads
+        
+        # Each source's articles are stored as soon as that source finishes,
+        # with their images still pending, so the listener above can update them
+        new_count = 0
+        def store_articles(name, articles):
+            nonlocal new_count
+            if not articles:
+                return
+            try:
+                new_count += db.add_articles(articles)
+            except Exception as e:
+                logger.error(f"Error storing articles from {name}: {str(e)}")
+        
+        # No limit on articles per source for Railway
+        is_railway = 'RAILWAY_ENVIRONMENT' in os.environ
+        logger.info(f"Scraping in {'Railway' if is_railway else 'Local'} environment")
+        limit = None  # Get all articles regardless of environment
+        
+        # Skip sources whose circuit is open; probe the ones whose cool-down has elapsed
+        skipped_count = 0
+        active_scrapers = {}
         for name, scraper in scrapers.items():
+            decision = breaker.allow(scraper.name)
+            if decision == 'skip':
+                logger.warning(f"Skipping {name}: circuit open after repeated failures")
+                skipped_count += 1
+                continue
+            if decision == 'probe':
+                logger.info(f"Probing {name} before scraping (circuit half-open)")
+                if not breaker.probe(scraper):
+                    logger.warning(f"Probe for {name} failed, circuit re-opened")
+                    skipped_count += 1
+                    continue
+            active_scrapers[name] = scraper
+        
+        # With the async engine every source is scraped concurrently up front
+        engine_results = {}
+        if SCRAPER_ENGINE == 'async':
+            from async_scraper import AsyncScrapeEngine
+            logger.info("Scraping all sources concurrently with the async engine")
+            engine_results = AsyncScrapeEngine().run(active_scrapers, limit=limit, on_source_done=store_articles,
+                                                     url_filter=db.filter_new_urls)
+        
+        for name, scraper in active_scrapers.items():
             try:
                 logger.info(f"Scraping from {name}")
-                # Add a retry mechanism for Railway environment
-                max_retries = 3
-                retry_count = 0
-                articles = []
-                
-                while retry_count < max_retries and not articles:
-                    try:
-                        # No limit on articles per source for Railway
-                        is_railway = 'RAILWAY_ENVIRONMENT' in os.environ
-                        # Log the environment
-                        logger.info(f"Scraping in {'Railway' if is_railway else 'Local'} environment")
-                        limit = None  # Get all articles regardless of environment
-                        articles = scraper.scrape(limit=limit)
-                        if articles:
-                            break
-                    except Exception as retry_error:
-                        logger.warning(f"Retry {retry_count+1}/{max_retries} for {name} failed: {str(retry_error)}")
-                        retry_count += 1
-                        time.sleep(2)  # Wait before retrying
+                if name in engine_results:
+                    articles = engine_results[name]
+                else:
+                    # Skip article pages that are already in the database
+                    articles = scraper.scrape(limit=limit, url_filter=db.filter_new_urls)
+                    store_articles(name, articles)
                 
+                # A source whose listing is unchanged or whose articles are all
+                # already stored has nothing new, which is not a failure
                 if articles:
                     all_articles.extend(articles)
                     logger.info(f"Got {len(articles)} articles from {name}")
                     success_count += 1
+                    breaker.record_success(scraper.name)
+                elif scraper.listing_not_modified:
+                    logger.info(f"No new articles from {name} (listing not modified)")
+                    success_count += 1
+                    breaker.record_success(scraper.name)
+                elif scraper.skipped_urls:
+                    logger.info(f"No new articles from {name} ({scraper.skipped_urls} already stored)")
+                    success_count += 1
+                    breaker.record_success(scraper.name)
                 else:
-                    logger.error(f"Failed to get articles from {name} after {max_retries} retries")
+                    logger.error(f"Failed to get articles from {name}")
                     error_count += 1
+                    breaker.record_failure(scraper.name, "No articles found")
             except Exception as e:
                 logger.error(f"Error scraping {name}: {str(e)}")
                 logger.error(traceback.format_exc())
                 error_count += 1
+                breaker.record_failure(scraper.name, str(e))
         
-        logger.info(f"Scraping summary: {success_count} sources succeeded, {error_count} sources failed")
+        logger.info(f"Retry budget left after scraping: {http_client.retry_budget.remaining}")
+        logger.info(f"Scraping summary: {success_count} sources succeeded, {error_count} sources failed, {skipped_count} sources skipped")
         
-        # Add articles to database
+        # Articles were added to the database as each source finished; this
+        # only stores any that an early insert failed to
         if all_articles:
-            # Add to database
-            new_count = db.add_articles(all_articles)
+            new_count += db.add_articles(all_articles)
             logger.info(f"Added {new_count} new articles to database")
             
+            # Articles are stored with pending images; wait for the downloads and
+            # record every result, covering any that finished before their row existed
+            downloads.join()
+            db.update_article_images(all_articles)
+            logger.info("Background image downloads finished")
+            
+            # Remove stored images that no article references
+            removed_images = db.collect_image_garbage()
+            if removed_images:
+                logger.info(f"Removed {removed_images} unreferenced images")
+            
+            # Resize new images into responsive variants in a process pool
+            resized_images = db.generate_image_variants()
+            if resized_images:
+                logger.info(f"Generated variants for {resized_images} images")
+            
             # Export to JSON
             article_count = db.export_to_json()
             logger.info(f"Exported {article_count} articles to JSON")
@@ -140,6 +248,12 @@ def run_scraper():
                     logger.info(f"JSON article count: {json_data.get('article_count', 0)}")
             else:
                 logger.warning("gaming_news.json does not exist")
+        elif success_count:
+            # Every source that answered had nothing new, which is the usual case.
+            # The export returns without writing unless its file is missing or stale
+            logger.info("No new articles this run")
+            article_count = db.export_to_json()
+            logger.info(f"JSON export has {article_count} articles")
         else:
             logger.error("No articles were scraped. Checking if database already has articles")
             
@@ -163,10 +277,29 @@ def run_scraper():
     except Exception as e:
         logger.error(f"Error during scraping: {str(e)}")
         logger.error(traceback.format_exc())
+    finally:
+        if downloads:
+            downloads.shutdown()
+        # Checkpoint after every run as well: under gunicorn the scheduler (and
+        # with it the interval job) is never started. TRUNCATE waits for readers
+        # and empties the WAL, so the run's writes all land in news.db itself
+        run_db_maintenance('TRUNCATE')
+
+# Periodic database upkeep: checkpoint the WAL and refresh planner statistics
+def run_db_maintenance(checkpoint_mode='PASSIVE'):
+    try:
+        result = db.run_maintenance(checkpoint_mode)
+        logger.info(f"Database maintenance: checkpointed {result['checkpointed_pages']}/{result['wal_pages']} WAL pages")
+    except Exception as e:
+        logger.error(f"Error during database maintenance: {str(e)}")
+
+# Minutes between database maintenance runs
+DB_MAINTENANCE_INTERVAL = int(os.environ.get('SQLITE_MAINTENANCE_INTERVAL', 30))
 
 # Set up scheduler
 scheduler = BackgroundScheduler()
 scheduler.add_job(run_scraper, 'interval', hours=3)  # Run every 3 hours
+scheduler.add_job(run_db_maintenance, 'interval', minutes=DB_MAINTENANCE_INTERVAL)
 
 # Add a health check endpoint that also triggers scraping
 @app.route('/health')
@@ -202,11 +335,13 @@ def index():
     endpoints = {
         "endpoints": {
             "GET /": "API documentation",
-            "GET /articles": "Get all articles with pagination",
+            "GET /articles": "Get all articles with pagination (limit/offset, or cursor=<next_cursor>)",
+            "GET /articles.ndjson": "Stream all articles as newline-delimited JSON (optional source filter)",
             "GET /articles/<article_id>": "Get a specific article by ID",
             "GET /articles/sources": "Get list of available news sources",
-            "GET /articles/search?q=<query>": "Search articles by keyword",
+            "GET /articles/search?q=<query>": "Search articles by keyword (\"phrases\", prefix*, sort=relevance|recent)",
             "GET /json": "Get the entire dataset as a static JSON file",
+            "GET /exports/manifest.json": "List the per-source and per-day export shards with ETags and counts",
             "GET /logs": "View application logs",
             "GET /debug": "Get debug information about the environment"
         }
@@ -220,56 +355,43 @@ def get_articles():
     limit = request.args.get('limit', default=None, type=int)  # No default limit
     offset = request.args.get('offset', default=0, type=int)
     source = request.args.get('source', default=None, type=str)
+    cursor = request.args.get('cursor', default=None, type=str)
     
-    logger.info(f"API request: /articles with limit={limit}, offset={offset}, source={source}")
+    logger.info(f"API request: /articles with limit={limit}, offset={offset}, source={source}, cursor={cursor}")
     
-    # First check if we have a JSON file with articles
-    json_file_path = 'gaming_news.json'
-    if os.path.exists(json_file_path):
-        try:
-            with open(json_file_path, 'r', encoding='utf-8') as f:
-                json_data = json.load(f)
-                json_articles = json_data.get('articles', [])
-                logger.info(f"Found {len(json_articles)} articles in JSON file")
-                
-                # Filter by source if needed
-                if source:
-                    json_articles = [a for a in json_articles if a.get('source_name', '').lower() == source.lower()]
-                
-                # Apply pagination - no default limit
-                total_count = len(json_articles)
-                paginated_articles = json_articles[offset:offset+limit] if limit is not None else json_articles[offset:]
-                
-                # Format articles
-                formatted_articles = [
-                    OrderedDict([
-                        ("id", article.get('id', '')),
-                        ("title", article.get('title', '')),
-                        ("content", article.get('content', '')),
-                        ("source_name", article.get('source_name', '')),
-                        ("source_url", article.get('source_url', '')),
-                        ("image_url", article.get('image_url', '')),
-                        ("local_image_path", article.get('local_image_path', '')),
-                        ("scrape_timestamp", article.get('scrape_timestamp', ''))
-                    ]) for article in paginated_articles
-                ]
-                
-                logger.info(f"Returning {len(formatted_articles)} articles from JSON file")
-                return jsonify({
-                    "total": total_count,
-                    "offset": offset,
-                    "limit": limit,
-                    "articles": formatted_articles
-                })
-        except Exception as e:
-            logger.error(f"Error reading from JSON file: {str(e)}")
-            logger.error(traceback.format_exc())
-            # Continue to database as fallback
+    # A cursor (the next_cursor of a previous page) takes precedence over offset
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
+    
+    # Serve from the in-memory snapshot of the source's shard or of the whole
+    # JSON export when there is one
+    try:
+        shard = get_source_snapshot(source) if source else None
+        snapshot = shard or articles_snapshot.get()
+        if snapshot is not None:
+            # Apply pagination - no default limit
+            paginated_articles, total_count, next_cursor = snapshot.page(None if shard else source, limit, offset, after)
+            
+            logger.info(f"Returning {len(paginated_articles)} articles from snapshot (generation {snapshot.generation})")
+            return jsonify({
+                "total": total_count,
+                "offset": offset,
+                "limit": limit,
+                "next_cursor": next_cursor,
+                "articles": paginated_articles
+            })
+    except Exception as e:
+        logger.error(f"Error reading from JSON file: {str(e)}")
+        logger.error(traceback.format_exc())
+        # Continue to database as fallback
     
     # Get articles from database as fallback
     logger.info("Falling back to database query")
-    articles = db.get_all_articles(limit=limit, offset=offset, source=source)
+    articles = db.get_all_articles(limit=limit, offset=offset, source=source, after=after)
     total_count = db.get_article_count(source=source)
+    next_cursor = next_page_cursor(articles, limit)
     logger.info(f"Found {len(articles)} articles in database (total: {total_count})")
     
     # If no articles found, use fallback data as last resort
@@ -277,6 +399,7 @@ def get_articles():
         logger.warning("No articles in database, using fallback data as last resort")
         articles = get_fallback_articles()
         total_count = len(articles)
+        next_cursor = None
         logger.info(f"Using {total_count} fallback articles")
         
         # Try to add fallback articles to database in a background thread to avoid blocking
@@ -315,9 +438,34 @@ def get_articles():
         "total": total_count,
         "offset": offset,
         "limit": limit,
+        "next_cursor": next_cursor,
         "articles": formatted_articles
     })
 
+@app.route('/articles.ndjson')
+def stream_articles_ndjson():
+    """Stream articles as newline-delimited JSON, one article per line, with constant memory"""
+    source = request.args.get('source', default=None, type=str)
+    
+    # The full feed is the NDJSON export, sent straight from disk
+    ndjson_file = os.path.abspath(ndjson_path('gaming_news.json'))
+    if not source and os.path.exists(ndjson_file):
+        response = send_file(ndjson_file, mimetype='application/x-ndjson', conditional=True)
+        response.cache_control.public = True
+        response.cache_control.no_cache = True
+        return response
+    
+    # One source (or no export yet): stream rows from a database cursor
+    if source:
+        # Match the source name case-insensitively, like /articles does
+        source = next((name for name in db.get_article_sources() if name.lower() == source.lower()), source)
+    
+    def generate():
+        for article in db.iter_articles(source=source):
+            yield json.dumps(article, ensure_ascii=False) + '\n'
+    
+    return Response(generate(), mimetype='application/x-ndjson')
+
 @app.route('/articles/<article_id>')
 def get_article(article_id):
     """Get a specific article by ID"""
@@ -352,11 +500,28 @@ def search_articles():
     query = request.args.get('q', default='', type=str)
     limit = request.args.get('limit', default=10, type=int)
     offset = request.args.get('offset', default=0, type=int)
+    cursor = request.args.get('cursor', default=None, type=str)
+    sort = request.args.get('sort', default='relevance', type=str)
     
     if not query:
         return jsonify({"error": "Search query is required"}), 400
+    
+    # Relevance-ranked results page by offset; newest-first results page by keyset
+    ranked = sort != 'recent' and db.fts_enabled
+    after = None
+    try:
+        if ranked and cursor:
+            offset = decode_offset_cursor(cursor)
+        elif cursor:
+            after = decode_cursor(cursor)
+    except InvalidCursor as e:
+        return jsonify({"error": str(e)}), 400
         
-    articles = db.search_articles(query, limit=limit, offset=offset)
+    articles = db.search_articles(query, limit=limit, offset=offset, after=after,
+                                  sort='relevance' if ranked else 'recent')
+    next_cursor = None
+    if articles and len(articles) == limit:
+        next_cursor = encode_offset_cursor(offset + limit) if ranked else encode_cursor(articles[-1])
     
     # Format articles to include only necessary fields in the proper order
     formatted_articles = []
@@ -371,11 +536,15 @@ def search_articles():
             ("local_image_path", article.get('local_image_path', '')),
             ("scrape_timestamp", article.get('scrape_timestamp', ''))
         ])
+        if article.get('snippet'):
+            formatted_article["snippet"] = article['snippet']
         formatted_articles.append(formatted_article)
     
     return jsonify({
         "query": query,
+        "sort": 'relevance' if ranked else 'recent',
         "count": len(formatted_articles),
+        "next_cursor": next_cursor,
         "articles": formatted_articles
     })
 
@@ -386,23 +555,84 @@ def get_json():
     if not os.path.exists('gaming_news.json'):
         db.export_to_json()
     
-    # Read and return the JSON file
-    with open('gaming_news.json', 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    return jsonify(data)
+    # Send the exported bytes as they are, pre-compressed if the client accepts it
+    json_file_path = os.path.abspath('gaming_news.json')
+    stat = os.stat(json_file_path)
+    etag = f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    file_path, encoding = precompress.negotiate(json_file_path, request.accept_encodings)
+    
+    response = send_file(file_path, mimetype='application/json', conditional=True,
+                         etag=f"{etag}-{encoding}" if encoding else etag)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
+
+@app.route('/exports/<path:filename>')
+def serve_export(filename):
+    """Serve the sharded export files and their manifest"""
+    # Shards change between exports, so clients revalidate with the ETag
+    response = send_from_directory(export_shards.EXPORTS_DIR, filename, conditional=True, max_age=0)
+    response.cache_control.public = True
+    response.cache_control.no_cache = True
+    return response
+
+# Scraped images and content files are never modified once written
+ASSET_MAX_AGE = 365 * 24 * 60 * 60
+
+def asset_etag(path):
+    """Strong ETag from file identity: the content hash for stored images, otherwise inode/mtime/size"""
+    relative_path = path.replace(os.sep, '/')
+    if image_store.digest_from_path(relative_path) or relative_path.startswith('images/variants/'):
+        # Store and variant file names are derived from the content hash; the
+        # extension keeps the JPEG and WebP variants of one width apart
+        return os.path.basename(relative_path)
+    stat = os.stat(path)
+    return f"{stat.st_ino:x}-{stat.st_mtime_ns:x}-{stat.st_size:x}"
+
+def send_asset(directory, filename, immutable=True):
+    """
+    Send a file with a strong ETag, 304s and Range support, and long-lived
+    immutable caching unless immutable is False (the client then revalidates)
+    """
+    path = safe_join(directory, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+    response = send_from_directory(directory, filename, as_attachment=False, conditional=True,
+                                   etag=asset_etag(path), max_age=ASSET_MAX_AGE if immutable else 0)
+    response.cache_control.public = True
+    if immutable:
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
 
 @app.route('/images/<path:filename>')
 def serve_image(filename):
-    """Serve images from the images directory"""
-    # Create images directory if it doesn't exist
-    if not os.path.exists('images'):
-        os.makedirs('images')
-    return send_from_directory('images', filename, as_attachment=False)
+    """Serve images from the images directory, or a resized variant with ?w=<width>"""
+    width = request.args.get('w', type=int)
+    digest = image_store.digest_from_path(f"images/{filename}") if width else None
+    if digest:
+        accepts_webp = 'image/webp' in request.headers.get('Accept', '')
+        variant = image_variants.pick_variant(db.get_image_variants(digest), width, accepts_webp)
+        if variant:
+            filename = variant['path'][len('images/'):]
+        # Without a variant this URL sends the original. That is final once the
+        # image's variants have been generated (none was wide enough), but while
+        # they are pending a variant may replace it, so it can't be cached as immutable
+        immutable = variant is not None or db.image_variants_generated(digest)
+        response = send_asset('images', filename, immutable=immutable)
+        response.vary.add('Accept')
+        return response
+    
+    return send_asset('images', filename)
 
 @app.route('/content/<path:filename>')
 def serve_content(filename):
     """Serve content files from the content directory"""
-    return send_from_directory('content', filename)
+    return send_asset('content', filename)
 
 @app.route('/logs')
 def view_logs():
@@ -446,6 +676,7 @@ def debug_info():
             "json_exists": os.path.exists('gaming_news.json'),
             "json_size": os.path.getsize('gaming_news.json') if os.path.exists('gaming_news.json') else 0,
             "article_count_in_db": db.get_article_count(),
+            "source_health": db.get_source_health(),
             "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
         
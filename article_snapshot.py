@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+In-memory snapshot of the exported articles.
+
+GET /articles used to json.load the whole export on every request. The
+snapshot loads it once, formats every article once and keeps a list per
+source, so a request only slices a list (or bisects to a cursor). It is
+reloaded when the file's identity (mtime, size, inode) changes or when this
+process exports a new generation (NewsDatabase.export_generation).
+"""
+import os
+import json
+import bisect
+import threading
+from collections import OrderedDict
+from pagination import article_key, encode_cursor
+
+# Fields returned for each article, in order
+ARTICLE_FIELDS = ("id", "title", "content", "source_name", "source_url",
+                  "image_url", "local_image_path", "scrape_timestamp")
+
+
+def format_article(article):
+    """Keep only the public fields of an article, in their fixed order"""
+    return OrderedDict((field, article.get(field, '')) for field in ARTICLE_FIELDS)
+
+
+class Snapshot:
+    def __init__(self, data, file_key, generation):
+        self.file_key = file_key
+        self.generation = generation
+        self.scrape_timestamp = data.get('scrape_timestamp')
+        # Newest first in (scrape_timestamp, id) order, which cursors rely on
+        self.articles = sorted((format_article(article) for article in data.get('articles', [])),
+                               key=article_key, reverse=True)
+
+        # Per-source views, keyed by lower-cased source name
+        self.by_source = {}
+        for article in self.articles:
+            self.by_source.setdefault(article['source_name'].lower(), []).append(article)
+
+        # Ascending keys of each view, for bisecting to a cursor
+        self._keys = {None: [article_key(a) for a in reversed(self.articles)]}
+        for name, articles in self.by_source.items():
+            self._keys[name] = [article_key(a) for a in reversed(articles)]
+
+    def view(self, source=None):
+        """All articles, or those of one source, newest first"""
+        if source:
+            return self.by_source.get(source.lower(), [])
+        return self.articles
+
+    def page(self, source=None, limit=None, offset=0, after=None):
+        """
+        Slice a view by offset, or by keyset when after (a decoded cursor) is given
+
+        Returns:
+            tuple: (articles, total in the view, next cursor or None on the last page)
+        """
+        articles = self.view(source)
+        if after:
+            # Articles after the cursor are the ones with a smaller key
+            keys = self._keys.get(source.lower() if source else None, [])
+            start = len(articles) - bisect.bisect_left(keys, tuple(after))
+        else:
+            start = offset
+        end = start + limit if limit is not None else len(articles)
+        page = articles[start:end]
+        next_cursor = encode_cursor(page[-1]) if page and end < len(articles) else None
+        return page, len(articles), next_cursor
+
+
+class ArticleSnapshot:
+    def __init__(self, json_file, db=None):
+        self.json_file = json_file
+        self.db = db
+        self._snapshot = None
+        self._lock = threading.Lock()
+
+    def _file_key(self):
+        stat = os.stat(self.json_file)
+        return (stat.st_mtime_ns, stat.st_size, stat.st_ino)
+
+    def _generation(self):
+        return self.db.export_generation if self.db is not None else None
+
+    def _is_current(self, snapshot, file_key, generation):
+        if snapshot is None or snapshot.file_key != file_key:
+            return False
+        # An export by this process is picked up even within the file's mtime resolution
+        return generation is None or snapshot.generation is None or snapshot.generation >= generation
+
+    def get(self):
+        """
+        Return the current snapshot, reloading it if the export changed.
+        Returns None if there is no export file yet.
+        """
+        try:
+            file_key = self._file_key()
+        except FileNotFoundError:
+            return None
+
+        generation = self._generation()
+        snapshot = self._snapshot
+        if self._is_current(snapshot, file_key, generation):
+            return snapshot
+
+        with self._lock:
+            # Another request may have reloaded it while we waited
+            snapshot = self._snapshot
+            if self._is_current(snapshot, file_key, generation):
+                return snapshot
+
+            with open(self.json_file, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            snapshot = Snapshot(data, file_key, data.get('export_generation', generation))
+            self._snapshot = snapshot
+            return snapshot
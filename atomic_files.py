@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Crash-safe file writes.
+
+Artifacts such as gaming_news.json are read by other gunicorn workers while
+they are being regenerated. atomic_write writes to a temp file in the same
+directory, fsyncs it, renames it over the target and fsyncs the directory,
+so a reader sees either the old file or the new one, never a partial file,
+and a crash can't leave a truncated file behind. Bulk writes of many small
+files (article content) pass durable=False to skip the directory fsync.
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+# Permissions for new files; mkstemp would otherwise create them owner-only
+DEFAULT_MODE = 0o644
+
+
+def fsync_directory(directory):
+    """Flush a directory entry change (e.g. a rename) to disk, where the platform allows it"""
+    try:
+        fd = os.open(directory, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+@contextmanager
+def atomic_write(path, mode='w', encoding='utf-8', durable=True):
+    """
+    Open a temp file for writing that replaces path when the block exits
+    without an exception; on an exception the target is left untouched.
+    With durable=False the directory isn't fsynced, so a crash may lose the
+    rename (readers still never see a partial file).
+
+    Usage:
+        with atomic_write('gaming_news.json') as f:
+            json.dump(data, f)
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix=f".{os.path.basename(path)}.", suffix='.tmp', dir=directory)
+    try:
+        try:
+            os.chmod(temp_path, os.stat(path).st_mode & 0o777)
+        except FileNotFoundError:
+            os.chmod(temp_path, DEFAULT_MODE)
+        with os.fdopen(fd, mode, encoding=None if 'b' in mode else encoding) as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+    if durable:
+        fsync_directory(directory)
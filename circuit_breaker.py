@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Per-source circuit breaker.
+
+A source that fails several scheduled runs in a row is skipped for a
+cool-down window instead of burning its full timeout budget every run.
+After the cool-down a single probe request decides whether the source is
+scraped again. State lives in the source_health table so it survives
+restarts.
+"""
+import os
+from datetime import datetime, timedelta
+import http_client
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+# Consecutive failed runs before a source is skipped
+FAILURE_THRESHOLD = int(os.environ.get('CIRCUIT_FAILURE_THRESHOLD', 3))
+
+# How long (seconds) an open circuit skips its source before probing again
+COOLDOWN = int(os.environ.get('CIRCUIT_COOLDOWN', 6 * 60 * 60))
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+
+class CircuitBreaker:
+    def __init__(self, db, failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN):
+        self.db = db
+        self.failure_threshold = failure_threshold
+        self.cooldown = timedelta(seconds=cooldown)
+
+    def _health(self, source_name):
+        return self.db.get_source_health(source_name) or {
+            'source_name': source_name,
+            'state': CLOSED,
+            'consecutive_failures': 0
+        }
+
+    def allow(self, source_name):
+        """
+        Decide whether a source should be scraped this run
+
+        Returns:
+            str: 'run' if the circuit is closed, 'probe' if it should be probed, 'skip' otherwise
+        """
+        health = self._health(source_name)
+        if health['state'] == CLOSED:
+            return 'run'
+        if health['state'] == HALF_OPEN:
+            # A previous probe never finished; probe again
+            return 'probe'
+
+        opened_at = health.get('opened_at')
+        if opened_at and datetime.now() - datetime.strptime(opened_at, TIMESTAMP_FORMAT) < self.cooldown:
+            return 'skip'
+
+        health['state'] = HALF_OPEN
+        self.db.save_source_health(health)
+        return 'probe'
+
+    def probe(self, scraper):
+        """Send one request to the source's home page; True if it answered successfully"""
+        try:
+            response = http_client.fetch(scraper.base_url, retries=0)
+            response.close()
+            if response.status_code < 400:
+                return True
+            error = f"Probe got HTTP {response.status_code}"
+        except Exception as e:
+            error = f"Probe failed: {e}"
+
+        self.record_failure(scraper.name, error)
+        return False
+
+    def record_success(self, source_name):
+        health = self._health(source_name)
+        health.update({
+            'state': CLOSED,
+            'consecutive_failures': 0,
+            'opened_at': None,
+            'last_success': datetime.now().strftime(TIMESTAMP_FORMAT)
+        })
+        self.db.save_source_health(health)
+
+    def record_failure(self, source_name, error=None):
+        health = self._health(source_name)
+        now = datetime.now().strftime(TIMESTAMP_FORMAT)
+        health['consecutive_failures'] = health.get('consecutive_failures', 0) + 1
+        health['last_failure'] = now
+        health['last_error'] = error
+
+        # A failed probe re-opens the circuit straight away
+        if health['state'] == HALF_OPEN or health['consecutive_failures'] >= self.failure_threshold:
+            health['state'] = OPEN
+            health['opened_at'] = now
+        self.db.save_source_health(health)
@@ -1,26 +1,150 @@
 #!/usr/bin/env python3
 import os
+import re
+import sys
 import json
+import html
 import sqlite3
 import hashlib
+import textwrap
 import threading
-from datetime import datetime
+from datetime import datetime, timedelta
 from collections import OrderedDict
+import image_store
+import image_variants
+import precompress
+import export_shards
+from atomic_files import atomic_write
+
+# Connection pragmas. 'tuned' lets API readers run while the scraper writes
+# (WAL) and trades a little durability on power loss for far fewer fsyncs;
+# 'default' keeps SQLite's own settings (rollback journal, synchronous=FULL)
+SQLITE_PROFILES = {
+    'default': {},
+    'tuned': {
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': 256 * 1024 * 1024,
+        'cache_size': -64000,  # negative means KiB, i.e. 64 MB
+        'temp_store': 'MEMORY',
+        'busy_timeout': 5000,  # milliseconds
+    },
+}
+SQLITE_PROFILE = os.environ.get('SQLITE_PROFILE', 'tuned')
+
+def sqlite_pragmas(profile=SQLITE_PROFILE):
+    """
+    Pragmas for a profile, with any of them overridden by an environment
+    variable named after it, e.g. SQLITE_MMAP_SIZE=0 or SQLITE_SYNCHRONOUS=FULL
+    """
+    pragmas = dict(SQLITE_PROFILES.get(profile, SQLITE_PROFILES['tuned']))
+    for name in ('journal_mode', 'synchronous', 'mmap_size', 'cache_size', 'temp_store', 'busy_timeout'):
+        value = os.environ.get(f'SQLITE_{name.upper()}')
+        if value:
+            pragmas[name] = value
+    return pragmas
+
+# Incremental exports between full rewrites of the JSON export
+EXPORT_COMPACT_EVERY = int(os.environ.get('EXPORT_COMPACT_EVERY', 24))
+
+# Maximum age (seconds) of the last full rewrite before the next export compacts
+EXPORT_COMPACT_INTERVAL = int(os.environ.get('EXPORT_COMPACT_INTERVAL', 24 * 60 * 60))
+
+# Fixed byte sequences of the export layout, used to splice new articles in
+EXPORT_ARTICLES_OPEN = b'    "articles": '
+EXPORT_TAIL = b'\n    ]\n}'
+EXPORT_EMPTY_TAIL = b'[]\n}'
+
+def ndjson_path(json_file):
+    """Path of the newline-delimited export written alongside a JSON export"""
+    return os.path.splitext(json_file)[0] + '.ndjson'
+
+# seq numbers articles in insertion order (see create_tables)
+ARTICLE_INSERT_SQL = '''
+INSERT INTO articles (
+    id, title, description, content, source_name, source_url,
+    published_date, image_url, local_image_path, local_content_path, scrape_timestamp, image_status, seq
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, (SELECT COALESCE(MAX(seq), 0) + 1 FROM articles))'''
+
+# BM25 weight of a title match relative to a content match
+SEARCH_TITLE_WEIGHT = 10.0
+
+# Private-use characters FTS5 puts around snippet matches; they are turned
+# into <mark> tags after the snippet text has been HTML-escaped
+SNIPPET_OPEN = '\ue000'
+SNIPPET_CLOSE = '\ue001'
+
+def highlight_snippet(snippet):
+    """HTML-escape a snippet and wrap its matches in <mark> tags"""
+    if not snippet:
+        return snippet
+    return html.escape(snippet).replace(SNIPPET_OPEN, '<mark>').replace(SNIPPET_CLOSE, '</mark>')
+
+_QUERY_TOKEN_RE = re.compile(r'"([^"]*)"|(\S+)')
+_WORD_RE = re.compile(r'\w+')
+
+def build_fts_query(query):
+    """
+    Turn a user search string into a safe FTS5 MATCH expression.
+    "Quoted text" is searched as a phrase, a trailing * makes a prefix query
+    and every other word must appear. FTS5 operators and punctuation in the
+    input are treated as plain text. Returns None if there is nothing to search.
+    """
+    terms = []
+    for phrase, word in _QUERY_TOKEN_RE.findall(query):
+        words = _WORD_RE.findall(phrase or word)
+        if not words:
+            continue
+        # Each term is a quoted FTS5 string, e.g. half-life becomes "half life"
+        term = '"' + ' '.join(words) + '"'
+        if not phrase and word.endswith('*'):
+            term += '*'
+        terms.append(term)
+    return ' '.join(terms) or None
 
 class NewsDatabase:
-    def __init__(self, db_path="news.db"):
+    def __init__(self, db_path="news.db", profile=SQLITE_PROFILE):
         """Initialize the database connection"""
         self.db_path = db_path
+        self.pragmas = sqlite_pragmas(profile)
         self.thread_local = threading.local()
+        # Id of the last export_history row written by this process; readers of
+        # the export use it to notice a new export (see article_snapshot)
+        self.export_generation = None
         self.create_tables()
 
     def connect(self):
         """Create a connection to the SQLite database that's thread-safe"""
         if not hasattr(self.thread_local, 'conn'):
-            self.thread_local.conn = sqlite3.connect(self.db_path)
-            self.thread_local.conn.row_factory = sqlite3.Row  # Return rows as dict-like objects
+            busy_timeout = int(self.pragmas.get('busy_timeout', 5000))
+            conn = sqlite3.connect(self.db_path, timeout=busy_timeout / 1000)
+            conn.row_factory = sqlite3.Row  # Return rows as dict-like objects
+            for name, value in self.pragmas.items():
+                conn.execute(f"PRAGMA {name} = {value}")
+            self.thread_local.conn = conn
         return self.thread_local.conn
 
+    def checkpoint(self, mode='PASSIVE'):
+        """
+        Copy WAL contents back into the database file so the WAL doesn't grow
+        without bound. PASSIVE never blocks readers or writers; TRUNCATE also
+        resets the WAL file. Returns (busy, wal_pages, checkpointed_pages).
+        """
+        conn = self.connect()
+        row = conn.execute(f"PRAGMA wal_checkpoint({mode})").fetchone()
+        return tuple(row)
+
+    def optimize(self):
+        """Let SQLite refresh the query planner statistics that need it"""
+        conn = self.connect()
+        conn.execute("PRAGMA optimize")
+
+    def run_maintenance(self, checkpoint_mode='PASSIVE'):
+        """Periodic upkeep: checkpoint the WAL and refresh planner statistics"""
+        busy, wal_pages, checkpointed = self.checkpoint(checkpoint_mode)
+        self.optimize()
+        return {"wal_pages": wal_pages, "checkpointed_pages": checkpointed, "busy": bool(busy)}
+
     def close(self):
         """Close the database connection"""
         if hasattr(self.thread_local, 'conn'):
@@ -50,10 +174,27 @@ class NewsDatabase:
         )
         ''')
         
+        # Columns added after the original schema
+        self._ensure_column(cursor, 'articles', 'image_status', "TEXT NOT NULL DEFAULT 'ready'")
+        
+        # Insertion order for incremental exports and the search index. The
+        # implicit rowid can't be used for that, since VACUUM may renumber it
+        if self._ensure_column(cursor, 'articles', 'seq', 'INTEGER'):
+            cursor.execute("UPDATE articles SET seq = rowid")
+        cursor.execute('CREATE UNIQUE INDEX IF NOT EXISTS idx_articles_seq ON articles(seq)')
+        
         # Create indexes for better query performance
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_scrape_timestamp ON articles(scrape_timestamp DESC)')
         cursor.execute('CREATE INDEX IF NOT EXISTS idx_source_name ON articles(source_name)')
         
+        # Keyset pagination walks (scrape_timestamp, id) newest first; id breaks ties
+        # between articles scraped in the same second
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_scrape_timestamp_id ON articles(scrape_timestamp DESC, id DESC)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_source_scrape_timestamp_id ON articles(source_name, scrape_timestamp DESC, id DESC)')
+        
+        # Title dedup looks articles up by (source_name, title)
+        self._migrate_title_index(cursor)
+        
         # Create export_history table to track JSON exports
         cursor.execute('''
         CREATE TABLE IF NOT EXISTS export_history (
@@ -64,7 +205,166 @@ class NewsDatabase:
         )
         ''')
         
+        # Create export_state table: what the last export of each file contained,
+        # so the next one only has to add newer articles (see export_to_json)
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS export_state (
+            filename TEXT PRIMARY KEY,
+            high_water INTEGER NOT NULL,
+            article_count INTEGER NOT NULL,
+            file_size INTEGER NOT NULL,
+            file_mtime_ns INTEGER NOT NULL,
+            exports_since_compaction INTEGER NOT NULL DEFAULT 0,
+            compacted_at TEXT NOT NULL
+        )
+        ''')
+        self._ensure_column(cursor, 'export_state', 'ndjson_size', 'INTEGER')
+        self._ensure_column(cursor, 'export_state', 'ndjson_mtime_ns', 'INTEGER')
+        
+        # Create source_health table to persist per-source circuit breaker state
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS source_health (
+            source_name TEXT PRIMARY KEY,
+            state TEXT NOT NULL DEFAULT 'closed',
+            consecutive_failures INTEGER NOT NULL DEFAULT 0,
+            opened_at TEXT,
+            last_success TEXT,
+            last_failure TEXT,
+            last_error TEXT
+        )
+        ''')
+        
+        # Create image tables: one row per stored image file, and a reference
+        # from each article to the file it uses, so files can be garbage collected
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'article_images'")
+        backfill_image_refs = cursor.fetchone() is None
+        
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_blobs (
+            digest TEXT PRIMARY KEY,
+            path TEXT NOT NULL,
+            size INTEGER,
+            ref_count INTEGER NOT NULL DEFAULT 0,
+            created_at TEXT NOT NULL
+        )
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS article_images (
+            article_id TEXT PRIMARY KEY,
+            digest TEXT NOT NULL
+        )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_article_images_digest ON article_images(digest)')
+        self._ensure_column(cursor, 'image_blobs', 'variants_at', 'TEXT')
+        
+        # Create image_variants table: resized copies of each stored image file
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_variants (
+            digest TEXT NOT NULL,
+            width INTEGER NOT NULL,
+            format TEXT NOT NULL,
+            height INTEGER,
+            path TEXT NOT NULL,
+            size INTEGER,
+            PRIMARY KEY (digest, width, format)
+        )
+        ''')
+        
+        # Full-text search index over titles and content (see search_articles)
+        backfill_search_index = self._create_search_index(cursor)
+        
+        conn.commit()
+        
+        if backfill_image_refs:
+            self.rebuild_image_refs()
+        if backfill_search_index:
+            self.rebuild_search_index()
+
+    def _create_search_index(self, cursor):
+        """
+        Create the FTS5 index and the triggers that keep it in step with articles.
+        Sets fts_enabled; returns True if the index is new and needs a backfill.
+        """
+        cursor.execute("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'articles_fts'")
+        row = cursor.fetchone()
+        if row and "content_rowid='seq'" not in row[0]:
+            # Older index keyed on the implicit rowid; rebuild it keyed on seq
+            for trigger in ('insert', 'delete', 'update'):
+                cursor.execute(f"DROP TRIGGER IF EXISTS articles_fts_{trigger}")
+            cursor.execute("DROP TABLE articles_fts")
+            row = None
+        is_new = row is None
+        try:
+            cursor.execute('''
+            CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+                title, content,
+                content='articles', content_rowid='seq',
+                tokenize='porter unicode61 remove_diacritics 2'
+            )
+            ''')
+        except sqlite3.OperationalError as e:
+            # SQLite built without FTS5; search falls back to LIKE
+            print(f"Warning: Full-text search unavailable, using LIKE search: {e}")
+            self.fts_enabled = False
+            return False
+        
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS articles_fts_insert AFTER INSERT ON articles BEGIN
+            INSERT INTO articles_fts (rowid, title, content) VALUES (new.seq, new.title, new.content);
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS articles_fts_delete AFTER DELETE ON articles BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, content) VALUES ('delete', old.seq, old.title, old.content);
+        END
+        ''')
+        cursor.execute('''
+        CREATE TRIGGER IF NOT EXISTS articles_fts_update AFTER UPDATE OF title, content ON articles BEGIN
+            INSERT INTO articles_fts (articles_fts, rowid, title, content) VALUES ('delete', old.seq, old.title, old.content);
+            INSERT INTO articles_fts (rowid, title, content) VALUES (new.seq, new.title, new.content);
+        END
+        ''')
+        self.fts_enabled = True
+        return is_new
+
+    def rebuild_search_index(self):
+        """Rebuild the full-text index from the articles table; returns the number of articles indexed"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute("INSERT INTO articles_fts (articles_fts) VALUES ('rebuild')")
+        cursor.execute("INSERT INTO articles_fts (articles_fts) VALUES ('optimize')")
         conn.commit()
+        cursor.execute("SELECT COUNT(*) FROM articles")
+        return cursor.fetchone()[0]
+
+    def _migrate_title_index(self, cursor):
+        """
+        Make (source_name, title) unique for non-empty titles, matching the
+        dedup rule in find_existing_articles. Databases that already hold
+        duplicates get a plain index instead, so lookups are still indexed;
+        the unique index is retried each time the database is opened.
+        """
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name = 'idx_source_title'")
+        if cursor.fetchone():
+            return
+        try:
+            cursor.execute("SAVEPOINT title_index")
+            cursor.execute("CREATE UNIQUE INDEX idx_source_title ON articles(source_name, title) WHERE title != ''")
+            cursor.execute("RELEASE title_index")
+            cursor.execute("DROP INDEX IF EXISTS idx_source_title_nonunique")
+        except sqlite3.IntegrityError:
+            cursor.execute("ROLLBACK TO title_index")
+            cursor.execute("RELEASE title_index")
+            print("Warning: Duplicate (source_name, title) rows found; using a non-unique title index")
+            cursor.execute("CREATE INDEX IF NOT EXISTS idx_source_title_nonunique ON articles(source_name, title) WHERE title != ''")
+
+    def _ensure_column(self, cursor, table, column, definition):
+        """Add a column to an existing table if an older database lacks it; True if it was added"""
+        cursor.execute(f"PRAGMA table_info({table})")
+        if column in [row[1] for row in cursor.fetchall()]:
+            return False
+        cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+        return True
 
     def generate_article_id(self, article):
         """Generate a unique ID for an article based on title and URL"""
@@ -75,39 +375,190 @@ class NewsDatabase:
 
     def article_exists(self, article):
         """Check if an article already exists in the database"""
+        return bool(self.find_existing_articles([article]))
+
+    def find_existing_articles(self, articles):
+        """
+        Find which of a batch of articles are already stored, in one query.
+        An article exists if its source_url is stored (most reliable) or, when
+        it has a title and source, an article from that source has that title.
+        
+        Returns:
+            dict: position in articles -> 'url' or 'title', for existing articles only
+        """
+        if not articles:
+            return {}
+        
         conn = self.connect()
         cursor = conn.cursor()
+        # Writing the temp table opens a transaction; end it unless the caller had one
+        own_transaction = not conn.in_transaction
         
-        # Check by URL first (most reliable)
-        cursor.execute("SELECT id FROM articles WHERE source_url = ?", 
-                      (article.get('source_url', ''),))
-        if cursor.fetchone():
-            return True
-            
-        # If no URL match, check by title and source
-        if article.get('title') and article.get('source_name'):
-            cursor.execute("SELECT id FROM articles WHERE title = ? AND source_name = ?", 
-                          (article.get('title', ''), article.get('source_name', '')))
-            if cursor.fetchone():
-                return True
-                
-        return False
+        # Candidates go into a temp table so both lookups are one indexed join
+        cursor.execute('''
+        CREATE TEMP TABLE IF NOT EXISTS dedup_candidates (
+            pos INTEGER PRIMARY KEY,
+            source_url TEXT,
+            source_name TEXT,
+            title TEXT
+        )
+        ''')
+        cursor.execute("DELETE FROM dedup_candidates")
+        cursor.executemany(
+            "INSERT INTO dedup_candidates (pos, source_url, source_name, title) VALUES (?, ?, ?, ?)",
+            [(pos, article.get('source_url', ''), article.get('source_name') or '', article.get('title') or '')
+             for pos, article in enumerate(articles)]
+        )
+        cursor.execute('''
+        SELECT c.pos,
+               EXISTS (SELECT 1 FROM articles a WHERE a.source_url = c.source_url) AS by_url,
+               c.title != '' AND c.source_name != '' AND EXISTS (
+                   SELECT 1 FROM articles a
+                   WHERE a.source_name = c.source_name AND a.title = c.title AND a.title != ''
+               ) AS by_title
+        FROM dedup_candidates c
+        ''')
+        existing = {}
+        for pos, by_url, by_title in cursor.fetchall():
+            if by_url:
+                existing[pos] = 'url'
+            elif by_title:
+                existing[pos] = 'title'
+        cursor.execute("DELETE FROM dedup_candidates")
+        if own_transaction:
+            conn.commit()
+        return existing
 
-    def add_article(self, article):
-        """Add a new article to the database if it doesn't already exist"""
-        if self.article_exists(article):
-            return False  # Article already exists
-            
+    def filter_new_urls(self, urls, chunk_size=500):
+        """
+        Return the URLs that are not yet stored, preserving their order.
+        Looks candidates up in bulk against the unique source_url index so a
+        scraper can skip fetching articles it already has.
+        """
+        if not urls:
+            return []
+        
         conn = self.connect()
         cursor = conn.cursor()
         
-        # Generate unique ID for the article
-        article_id = self.generate_article_id(article)
+        unique_urls = list(dict.fromkeys(urls))
+        known_urls = set()
+        for i in range(0, len(unique_urls), chunk_size):
+            chunk = unique_urls[i:i + chunk_size]
+            placeholders = ",".join("?" * len(chunk))
+            cursor.execute(f"SELECT source_url FROM articles WHERE source_url IN ({placeholders})", chunk)
+            known_urls.update(row[0] for row in cursor.fetchall())
         
-        # Current timestamp
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        return [url for url in unique_urls if url not in known_urls]
+
+    def _link_article_image(self, cursor, article_id, local_image_path):
+        """Point an article at its stored image file, keeping reference counts in step"""
+        digest = image_store.digest_from_path(local_image_path)
+        
+        cursor.execute("SELECT digest FROM article_images WHERE article_id = ?", (article_id,))
+        row = cursor.fetchone()
+        old_digest = row[0] if row else None
+        if old_digest == digest:
+            return
         
-        # Ensure content is in the article or read from content file
+        if old_digest:
+            cursor.execute("UPDATE image_blobs SET ref_count = ref_count - 1 WHERE digest = ?", (old_digest,))
+        
+        if digest:
+            size = os.path.getsize(local_image_path) if os.path.exists(local_image_path) else None
+            cursor.execute(
+                "INSERT OR IGNORE INTO image_blobs (digest, path, size, ref_count, created_at) VALUES (?, ?, ?, 0, ?)",
+                (digest, local_image_path, size, datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+            )
+            cursor.execute("UPDATE image_blobs SET ref_count = ref_count + 1 WHERE digest = ?", (digest,))
+            cursor.execute("INSERT OR REPLACE INTO article_images (article_id, digest) VALUES (?, ?)", (article_id, digest))
+        else:
+            cursor.execute("DELETE FROM article_images WHERE article_id = ?", (article_id,))
+
+    def rebuild_image_refs(self):
+        """Recompute article_images and image_blobs reference counts from the articles table"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        
+        cursor.execute("DELETE FROM article_images")
+        cursor.execute("UPDATE image_blobs SET ref_count = 0")
+        cursor.execute("SELECT id, local_image_path FROM articles WHERE local_image_path LIKE 'images/store/%'")
+        for article_id, local_image_path in cursor.fetchall():
+            self._link_article_image(cursor, article_id, local_image_path)
+        conn.commit()
+
+    def collect_image_garbage(self):
+        """
+        Delete stored image files that no article references any more.
+        Returns the number of files removed.
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+        
+        cursor.execute("SELECT digest FROM image_blobs WHERE ref_count > 0")
+        referenced = {row[0] for row in cursor.fetchall()}
+        removed = image_store.remove_unreferenced(referenced)
+        
+        # Forget blobs whose file is gone, along with their variants
+        cursor.execute("SELECT digest, path FROM image_blobs WHERE ref_count <= 0")
+        gone = [(digest,) for digest, path in cursor.fetchall() if not os.path.exists(path)]
+        for (digest,) in gone:
+            cursor.execute("SELECT path FROM image_variants WHERE digest = ?", (digest,))
+            image_variants.remove_variants([row[0] for row in cursor.fetchall()])
+        cursor.executemany("DELETE FROM image_variants WHERE digest = ?", gone)
+        cursor.executemany("DELETE FROM image_blobs WHERE digest = ?", gone)
+        conn.commit()
+        return removed
+
+    def get_images_without_variants(self):
+        """Return (digest, path) for referenced stored images that haven't been resized yet"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT digest, path FROM image_blobs WHERE ref_count > 0 AND variants_at IS NULL")
+        return [(row[0], row[1]) for row in cursor.fetchall() if os.path.exists(row[1])]
+
+    def save_image_variants(self, digest, variants):
+        """Record the variants generated for a stored image and mark it as processed"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.executemany(
+            "INSERT OR REPLACE INTO image_variants (digest, width, format, height, path, size) VALUES (?, ?, ?, ?, ?, ?)",
+            [(digest, v['width'], v['format'], v['height'], v['path'], v['size']) for v in variants]
+        )
+        cursor.execute("UPDATE image_blobs SET variants_at = ? WHERE digest = ?",
+                       (datetime.now().strftime("%Y-%m-%d %H:%M:%S"), digest))
+        conn.commit()
+
+    def get_image_variants(self, digest):
+        """Get the variants of a stored image, narrowest first"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT width, height, format, path, size FROM image_variants WHERE digest = ? ORDER BY width",
+                       (digest,))
+        return [dict(row) for row in cursor.fetchall()]
+
+    def image_variants_generated(self, digest):
+        """Whether a stored image has been through generate_image_variants"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM image_blobs WHERE digest = ? AND variants_at IS NOT NULL", (digest,))
+        return cursor.fetchone() is not None
+
+    def generate_image_variants(self):
+        """
+        Resize every stored image that has no variants yet (see image_variants).
+        Returns the number of images processed.
+        """
+        if not image_variants.is_available():
+            return 0
+        processed = 0
+        for digest, variants in image_variants.generate(self.get_images_without_variants()):
+            self.save_image_variants(digest, variants)
+            processed += 1
+        return processed
+
+    def _read_article_content(self, article):
+        """Content of an article, read from its content file if the field is empty"""
         content = article.get('content', '')
         if not content.strip() and 'content_file_path' in article:
             content_path = article.get('content_file_path')
@@ -117,40 +568,178 @@ class NewsDatabase:
                         content = f.read()
             except Exception as e:
                 print(f"Error reading content from {content_path}: {e}")
-        
-        # Insert the article
-        cursor.execute('''
-        INSERT INTO articles (
-            id, title, description, content, source_name, source_url, 
-            published_date, image_url, local_image_path, local_content_path, scrape_timestamp
-        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        ''', (
+        return content
+
+    def _article_row(self, article, article_id, now):
+        """Parameters for inserting an article, in ARTICLE_INSERT_SQL column order"""
+        return (
             article_id,
             article.get('title', ''),
             article.get('description', ''),
-            content,
+            self._read_article_content(article),
             article.get('source_name', ''),
             article.get('source_url', ''),
             article.get('published_date', ''),
             article.get('image_url', ''),
             article.get('local_image_path', ''),
             article.get('content_file_path', ''),
-            now
-        ))
+            now,
+            article.get('image_status', 'ready')
+        )
+
+    def add_article(self, article):
+        """Add a new article to the database if it doesn't already exist"""
+        if self.article_exists(article):
+            return False  # Article already exists
+            
+        conn = self.connect()
+        cursor = conn.cursor()
+        
+        # Generate unique ID for the article
+        article_id = self.generate_article_id(article)
+        
+        # Current timestamp
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        # Insert the article
+        cursor.execute(ARTICLE_INSERT_SQL, self._article_row(article, article_id, now))
+        self._link_article_image(cursor, article_id, article.get('local_image_path', ''))
         
         conn.commit()
         return True
 
+    def upsert_articles(self, articles, update_existing=False, update_images=True):
+        """
+        Store a batch of articles in one transaction.
+        New articles (see find_existing_articles) are inserted. With
+        update_existing, articles whose URL is already stored have their
+        title, description, content, published date and image URL refreshed
+        if any of them changed; update_images=False leaves the image URL alone.
+        
+        Returns:
+            dict: {'inserted': n, 'updated': n}
+        """
+        result = {'inserted': 0, 'updated': 0}
+        if not articles:
+            return result
+        
+        conn = self.connect()
+        cursor = conn.cursor()
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        
+        # One set-based lookup for the whole batch instead of queries per article
+        stored = self.find_existing_articles(articles)
+        
+        new_rows = []
+        new_images = []
+        existing = []
+        seen_urls = set()
+        seen_titles = set()
+        for pos, article in enumerate(articles):
+            if stored.get(pos) == 'url':
+                existing.append(article)
+                continue
+            if stored.get(pos) == 'title':
+                continue
+            
+            # Skip repeats within the batch
+            url = article.get('source_url', '')
+            title_key = (article.get('source_name', ''), article.get('title', ''))
+            if url in seen_urls or (all(title_key) and title_key in seen_titles):
+                continue
+            seen_urls.add(url)
+            seen_titles.add(title_key)
+            
+            article_id = self.generate_article_id(article)
+            new_rows.append(self._article_row(article, article_id, now))
+            new_images.append((article_id, article.get('local_image_path', '')))
+        
+        try:
+            cursor.executemany(ARTICLE_INSERT_SQL + " ON CONFLICT DO NOTHING", new_rows)
+            result['inserted'] = cursor.rowcount if new_rows else 0
+            for article_id, local_image_path in new_images:
+                self._link_article_image(cursor, article_id, local_image_path)
+            
+            if update_existing and existing:
+                if update_images:
+                    update_sql = '''
+                    UPDATE OR IGNORE articles SET title = ?1, description = ?2, content = ?3, published_date = ?4, image_url = ?5
+                    WHERE source_url = ?6
+                      AND (title IS NOT ?1 OR description IS NOT ?2 OR content IS NOT ?3
+                           OR published_date IS NOT ?4 OR image_url IS NOT ?5)
+                    '''
+                else:
+                    update_sql = '''
+                    UPDATE OR IGNORE articles SET title = ?1, description = ?2, content = ?3, published_date = ?4
+                    WHERE source_url = ?6
+                      AND (title IS NOT ?1 OR description IS NOT ?2 OR content IS NOT ?3
+                           OR published_date IS NOT ?4)
+                    '''
+                cursor.executemany(update_sql, [(
+                    article.get('title', ''),
+                    article.get('description', ''),
+                    self._read_article_content(article),
+                    article.get('published_date', ''),
+                    article.get('image_url', ''),
+                    article.get('source_url', '')
+                ) for article in existing])
+                result['updated'] = cursor.rowcount
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        return result
+
     def add_articles(self, articles):
-        """Add multiple articles and return count of new additions"""
-        added_count = 0
-        for article in articles:
-            if self.add_article(article):
-                added_count += 1
-        return added_count
-
-    def get_all_articles(self, limit=None, offset=0, source=None):
-        """Get all articles with optional filtering"""
+        """Add multiple articles in a single transaction and return count of new additions"""
+        return self.upsert_articles(articles)['inserted']
+
+    def update_article_image(self, source_url, local_image_path, image_status='ready'):
+        """Record the result of a background image download for an article"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        
+        cursor.execute(
+            "UPDATE articles SET local_image_path = ?, image_status = ? WHERE source_url = ?",
+            (local_image_path, image_status, source_url)
+        )
+        updated = cursor.rowcount > 0
+        if updated:
+            cursor.execute("SELECT id FROM articles WHERE source_url = ?", (source_url,))
+            self._link_article_image(cursor, cursor.fetchone()[0], local_image_path)
+        conn.commit()
+        return updated
+
+    def update_article_images(self, articles):
+        """Record the image download results for a batch of articles in one transaction"""
+        rows = [
+            (article.get('local_image_path', ''), article.get('image_status'), article.get('source_url', ''))
+            for article in articles
+            if article.get('image_status') in ('ready', 'failed')
+        ]
+        if not rows:
+            return 0
+        
+        conn = self.connect()
+        cursor = conn.cursor()
+        cursor.executemany("UPDATE articles SET local_image_path = ?, image_status = ? WHERE source_url = ?", rows)
+        updated = cursor.rowcount
+        
+        for local_image_path, _, source_url in rows:
+            cursor.execute("SELECT id FROM articles WHERE source_url = ?", (source_url,))
+            row = cursor.fetchone()
+            if row:
+                self._link_article_image(cursor, row[0], local_image_path)
+        conn.commit()
+        return updated
+
+    def get_all_articles(self, limit=None, offset=0, source=None, after=None):
+        """
+        Get all articles with optional filtering, newest first.
+        after is a (scrape_timestamp, id) key from pagination.decode_cursor;
+        only articles after it are returned and offset is ignored.
+        """
         conn = self.connect()
         cursor = conn.cursor()
         
@@ -158,15 +747,25 @@ class NewsDatabase:
         query = """SELECT id, title, content, source_name, source_url, 
                  image_url, local_image_path, local_content_path, scrape_timestamp 
                  FROM articles"""
+        conditions = []
         params = []
         
         # Add source filter if provided
         if source:
-            query += " WHERE source_name = ?"
+            conditions.append("source_name = ?")
             params.append(source)
+        
+        # Seek past the cursor using the (scrape_timestamp, id) index
+        if after:
+            conditions.append("(scrape_timestamp, id) < (?, ?)")
+            params.extend(after)
+            offset = 0
+        
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
             
         # Add ordering
-        query += " ORDER BY scrape_timestamp DESC"
+        query += " ORDER BY scrape_timestamp DESC, id DESC"
         
         # Add limit and offset
         if limit is not None:
@@ -212,80 +811,452 @@ class NewsDatabase:
         cursor.execute(query, params)
         return cursor.fetchone()[0]
 
-    def export_to_json(self, output_file='gaming_news.json'):
-        """Export all articles to a JSON file"""
-        conn = self.connect()
-        cursor = conn.cursor()
+    def _export_article(self, article):
+        """Public fields of an article for the export, filling empty content from its content file"""
+        # Make sure content is included
+        if not article.get('content') or article['content'].strip() == '':
+            # Try to read from content file if we stored a path
+            content_path = article.get('local_content_path')
+            if content_path and os.path.exists(content_path):
+                try:
+                    with open(content_path, 'r', encoding='utf-8') as f:
+                        article['content'] = f.read()
+                except Exception as e:
+                    print(f"Error reading content file {content_path}: {e}")
+            
+            # If still empty, try to create a default message
+            if not article.get('content') or article['content'].strip() == '':
+                article['content'] = f"Visit the source for more information: {article.get('source_url', 'Unknown source')}"
         
-        # Get all articles
-        cursor.execute("SELECT * FROM articles ORDER BY scrape_timestamp DESC")
-        articles = [dict(row) for row in cursor.fetchall()]
+        # Create a new dictionary with ordered keys and only necessary fields
+        return OrderedDict([
+            ("id", article.get('id', '')),
+            ("title", article.get('title', '')),
+            ("content", article.get('content', '')),
+            ("source_name", article.get('source_name', '')),
+            ("source_url", article.get('source_url', '')),
+            ("image_url", article.get('image_url', '')),
+            ("local_image_path", article.get('local_image_path', '')),
+            ("scrape_timestamp", article.get('scrape_timestamp', ''))
+        ])
+
+    def _previous_export(self, output_file, state):
+        """
+        Open the JSON and NDJSON files this exporter last wrote, for splicing.
+        Returns (json file, article list start, article list end, ndjson file,
+        ndjson size) with both files open, or None if the next export must be
+        a full rewrite. The files are checked and later copied through the
+        same descriptors, so a file swapped in by another writer in between is
+        never spliced.
+        """
+        if not state:
+            return None
+        if state['exports_since_compaction'] + 1 >= EXPORT_COMPACT_EVERY:
+            return None
+        compacted_at = datetime.strptime(state['compacted_at'], "%Y-%m-%d %H:%M:%S")
+        if (datetime.now() - compacted_at).total_seconds() >= EXPORT_COMPACT_INTERVAL:
+            return None
         
-        # Get content from content files if content field is empty
-        formatted_articles = []
-        for article in articles:
-            # Make sure content is included
-            if not article.get('content') or article['content'].strip() == '':
-                # Try to read from content file if we stored a path
-                content_path = article.get('local_content_path')
-                if content_path and os.path.exists(content_path):
-                    try:
-                        with open(content_path, 'r', encoding='utf-8') as f:
-                            article['content'] = f.read()
-                    except Exception as e:
-                        print(f"Error reading content file {content_path}: {e}")
-                
-                # If still empty, try to create a default message
-                if not article.get('content') or article['content'].strip() == '':
-                    article['content'] = f"Visit the source for more information: {article.get('source_url', 'Unknown source')}"
+        files = []
+        try:
+            for path in (output_file, ndjson_path(output_file)):
+                files.append(open(path, 'rb'))
+        except FileNotFoundError:
+            for f in files:
+                f.close()
+            return None
+        f, lines = files
+        
+        # Someone else (save_fallback_data, clear_data, ...) rewrote the file
+        stat = os.fstat(f.fileno())
+        ndjson_stat = os.fstat(lines.fileno())
+        span = None
+        if ((stat.st_size, stat.st_mtime_ns) == (state['file_size'], state['file_mtime_ns'])
+                and (ndjson_stat.st_size, ndjson_stat.st_mtime_ns) == (state['ndjson_size'], state['ndjson_mtime_ns'])):
+            span = self._article_span(f, stat.st_size)
+        if span is None:
+            f.close()
+            lines.close()
+            return None
+        return (f, span[0], span[1], lines, ndjson_stat.st_size)
+
+    def _article_span(self, f, size):
+        """Byte range of the article list in an open export file, or None if its layout is unexpected"""
+        head = f.read(4096)
+        f.seek(max(0, size - len(EXPORT_TAIL)))
+        tail = f.read()
+        start = head.find(EXPORT_ARTICLES_OPEN)
+        if start < 0:
+            return None
+        start += len(EXPORT_ARTICLES_OPEN)
+        if head[start:start + len(EXPORT_EMPTY_TAIL)] == EXPORT_EMPTY_TAIL and start + len(EXPORT_EMPTY_TAIL) == size:
+            return (start, start)
+        if head[start:start + 2] != b'[\n' or tail != EXPORT_TAIL:
+            return None
+        return (start + 2, size - len(EXPORT_TAIL))
+
+    def _copy_bytes(self, source, f, start, end):
+        """Copy the byte range [start, end) of the open file source into the open file f"""
+        source.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = source.read(min(1024 * 1024, remaining))
+            if not chunk:
+                raise IOError(f"{source.name} changed during export")
+            f.write(chunk)
+            remaining -= len(chunk)
+
+    def _write_export(self, output_file, header, articles, previous=None):
+        """
+        Write the export in json.dump(indent=4) layout: header fields, then
+        the formatted articles, then the raw bytes of the previous file's
+        article list if previous (from _previous_export) is given. The NDJSON
+        export gets the same articles, one per line, followed by its previous
+        contents.
+        """
+        with atomic_write(output_file, 'wb') as f, atomic_write(ndjson_path(output_file), 'wb') as lines:
+            f.write(b'{\n')
+            for key, value in header.items():
+                f.write(f'    {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},\n'.encode('utf-8'))
+            f.write(EXPORT_ARTICLES_OPEN)
             
-            # Create a new dictionary with ordered keys and only necessary fields
-            formatted_article = OrderedDict([
-                ("id", article.get('id', '')),
-                ("title", article.get('title', '')),
-                ("content", article.get('content', '')),
-                ("source_name", article.get('source_name', '')),
-                ("source_url", article.get('source_url', '')),
-                ("image_url", article.get('image_url', '')),
-                ("local_image_path", article.get('local_image_path', '')),
-                ("scrape_timestamp", article.get('scrape_timestamp', ''))
-            ])
+            first = True
+            for article in articles:
+                f.write(b'[\n' if first else b',\n')
+                first = False
+                f.write(textwrap.indent(json.dumps(article, ensure_ascii=False, indent=4), ' ' * 8).encode('utf-8'))
+                lines.write(json.dumps(article, ensure_ascii=False).encode('utf-8') + b'\n')
             
-            formatted_articles.append(formatted_article)
+            if previous:
+                previous_file, start, end, previous_lines, lines_size = previous
+                if end > start:
+                    f.write(b'[\n' if first else b',\n')
+                    first = False
+                    self._copy_bytes(previous_file, f, start, end)
+                self._copy_bytes(previous_lines, lines, 0, lines_size)
+            
+            f.write(EXPORT_EMPTY_TAIL if first else EXPORT_TAIL)
+
+    def export_to_json(self, output_file='gaming_news.json', full=False):
+        """
+        Export all articles to a JSON file, and one article per line to the
+        matching .ndjson file (see ndjson_path).
+        Exports are incremental: only articles added since the last export
+        (seq above its high-water mark) are read and formatted, and they are
+        spliced in front of the previous file's articles, which are copied as
+        raw bytes. The file is fully regenerated (compacted) when full is set,
+        every EXPORT_COMPACT_EVERY exports, after EXPORT_COMPACT_INTERVAL
+        seconds, or when the file isn't the one this exporter last wrote;
+        that is also when changes to already-exported rows show up.
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
         
-        # Create JSON structure
-        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        data = {
-            "scrape_timestamp": timestamp,
-            "article_count": len(formatted_articles),
-            "articles": formatted_articles
-        }
+        cursor.execute("SELECT * FROM export_state WHERE filename = ?", (output_file,))
+        row = cursor.fetchone()
+        state = dict(row) if row else None
+        previous = None if full else self._previous_export(output_file, state)
         
-        # Save to JSON file
-        with open(output_file, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-            
-        # Record this export
+        cursor.execute("SELECT COALESCE(MAX(seq), 0) FROM articles")
+        high_water = cursor.fetchone()[0]
+
+        if previous is not None and high_water == state['high_water']:
+            # Nothing was added and the files are the ones last written: leave
+            # them, their compressed copies and the shards as they are
+            previous[0].close()
+            previous[3].close()
+            return state['article_count']
+
+        articles_cursor = conn.cursor()
+        if previous is not None:
+            # Only the articles added since the last export
+            articles_cursor.execute(
+                "SELECT * FROM articles WHERE seq > ? AND seq <= ? ORDER BY scrape_timestamp DESC, id DESC",
+                (state['high_water'], high_water)
+            )
+            articles = [self._export_article(dict(row)) for row in articles_cursor.fetchall()]
+            article_count = state['article_count'] + len(articles)
+            exports_since_compaction = state['exports_since_compaction'] + 1
+            compacted_at = state['compacted_at']
+        else:
+            cursor.execute("SELECT COUNT(*) FROM articles WHERE seq <= ?", (high_water,))
+            article_count = cursor.fetchone()[0]
+            exports_since_compaction = 0
+            compacted_at = None
+        
+        # Record this export; its id is the export generation written into the file.
+        # It is committed right away so no write lock is held while the files are written
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         cursor.execute(
             "INSERT INTO export_history (timestamp, filename, article_count) VALUES (?, ?, ?)",
-            (timestamp, output_file, len(formatted_articles))
+            (timestamp, output_file, article_count)
         )
+        generation = cursor.lastrowid
         conn.commit()
         
-        return len(formatted_articles)
+        if previous is None:
+            # Get all articles, formatting them as they are written
+            articles_cursor.execute(
+                "SELECT * FROM articles WHERE seq <= ? ORDER BY scrape_timestamp DESC, id DESC", (high_water,)
+            )
+            articles = (self._export_article(dict(row)) for row in articles_cursor)
+        
+        header = OrderedDict([
+            ("scrape_timestamp", timestamp),
+            ("export_generation", generation),
+            ("article_count", article_count)
+        ])
+        
+        # Save to JSON file
+        try:
+            self._write_export(output_file, header, articles, previous)
+        except Exception:
+            cursor.execute("DELETE FROM export_history WHERE id = ?", (generation,))
+            conn.commit()
+            raise
+        finally:
+            if previous:
+                previous[0].close()
+                previous[3].close()
+        
+        stat = os.stat(output_file)
+        ndjson_stat = os.stat(ndjson_path(output_file))
+        cursor.execute('''
+        INSERT OR REPLACE INTO export_state (
+            filename, high_water, article_count, file_size, file_mtime_ns, exports_since_compaction, compacted_at,
+            ndjson_size, ndjson_mtime_ns
+        ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (output_file, high_water, article_count, stat.st_size, stat.st_mtime_ns,
+              exports_since_compaction, compacted_at or timestamp, ndjson_stat.st_size, ndjson_stat.st_mtime_ns))
+        conn.commit()
+        self.export_generation = generation
+        
+        # Compressed copies so /json can be sent without compressing per request;
+        # written after the commit so the write lock isn't held while compressing
+        precompress.write_siblings(output_file)
+        
+        # Per-source and per-day shards; an incremental export only touches the
+        # shards its new articles belong to
+        try:
+            self.export_shards(articles if previous is not None else None, generation)
+        except Exception as e:
+            print(f"Error writing export shards: {e}")
+        
+        return article_count
+
+    def export_shards(self, changed_articles=None, generation=None):
+        """
+        Write the per-source and per-day export shards and their manifest
+        (see export_shards). Only the shards that changed_articles belong to
+        are touched: their articles are spliced into the front of each source
+        shard and the day shards are rebuilt. With None every shard is rebuilt
+        and shards of sources or days without articles are removed.
+        Returns the number of files rewritten.
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+        manifest = export_shards.load_manifest()
+        
+        if changed_articles is None:
+            cursor.execute("SELECT DISTINCT source_name FROM articles")
+            sources = {row[0] for row in cursor.fetchall()}
+            cursor.execute("SELECT DISTINCT substr(scrape_timestamp, 1, 10) FROM articles")
+            days = {row[0] for row in cursor.fetchall()}
+        else:
+            sources = {article['source_name'] for article in changed_articles}
+            days = {article['scrape_timestamp'][:10] for article in changed_articles}
+        days = {day for day in days if day and re.match(r'^\d{4}-\d{2}-\d{2}$', day)}
+        
+        # New articles by source, newest first, to splice into the source shards
+        new_articles = {}
+        for article in changed_articles or []:
+            new_articles.setdefault(article['source_name'], []).append(article)
+        
+        rewritten = 0
+        for source in sorted(sources):
+            slug = export_shards.source_slug(source)
+            path = export_shards.source_shard_path(source)
+            entry = None
+            if source in new_articles:
+                entry = export_shards.splice_shard(path, 'source', source, new_articles[source],
+                                                   manifest['sources'].get(slug))
+                written = entry is not None
+            if entry is None:
+                # No usable previous shard: rebuild it from every article of the source
+                cursor.execute("SELECT * FROM articles WHERE source_name = ? ORDER BY scrape_timestamp DESC, id DESC",
+                               (source,))
+                articles = [self._export_article(dict(row)) for row in cursor.fetchall()]
+                entry, written = export_shards.write_shard(path, 'source', source, articles,
+                                                           manifest['sources'].get(slug))
+            manifest['sources'][slug] = entry
+            rewritten += written
+        
+        for day in sorted(days):
+            # A range on scrape_timestamp uses its index, unlike LIKE 'day%'
+            next_day = (datetime.strptime(day, "%Y-%m-%d") + timedelta(days=1)).strftime("%Y-%m-%d")
+            cursor.execute(
+                "SELECT * FROM articles WHERE scrape_timestamp >= ? AND scrape_timestamp < ? "
+                "ORDER BY scrape_timestamp DESC, id DESC", (day, next_day)
+            )
+            articles = [self._export_article(dict(row)) for row in cursor.fetchall()]
+            entry, written = export_shards.write_shard(export_shards.day_shard_path(day), 'day', day,
+                                                       articles, manifest['days'].get(day))
+            manifest['days'][day] = entry
+            rewritten += written
+        
+        if changed_articles is None:
+            # Drop shards whose source or day no longer has articles
+            slugs = {export_shards.source_slug(source) for source in sources}
+            for group, keep in (('sources', slugs), ('days', days)):
+                stale = [key for key in manifest[group] if key not in keep]
+                export_shards.remove_shards([manifest[group].pop(key) for key in stale])
+        
+        export_shards.save_manifest({
+            "generated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "export_generation": generation,
+            "sources": dict(sorted(manifest['sources'].items())),
+            "days": dict(sorted(manifest['days'].items(), reverse=True))
+        })
+        return rewritten
+
+    def iter_articles(self, source=None, batch_size=500):
+        """
+        Yield every article (or every article of one source) in export form,
+        newest first, fetching batch_size rows at a time so memory stays flat
+        """
+        conn = self.connect()
+        cursor = conn.cursor()
+        
+        query = "SELECT * FROM articles"
+        params = []
+        if source:
+            query += " WHERE source_name = ?"
+            params.append(source)
+        query += " ORDER BY scrape_timestamp DESC, id DESC"
+        
+        cursor.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for row in rows:
+                yield self._export_article(dict(row))
 
-    def search_articles(self, query, limit=10, offset=0):
-        """Search for articles by keyword"""
+    def search_articles(self, query, limit=10, offset=0, after=None, sort='relevance'):
+        """
+        Search for articles by keyword.
+        With the full-text index, results are ranked by BM25 (title matches
+        weigh more) unless sort is 'recent', and each has a highlighted
+        snippet: HTML-escaped article text with the matches in <mark> tags,
+        safe to insert as HTML. Supports "quoted phrases" and prefix* terms (see
+        build_fts_query). after works as in get_all_articles and implies
+        sort='recent'. Without FTS5 this falls back to a LIKE scan, newest first.
+        """
+        if not self.fts_enabled:
+            return self._search_articles_like(query, limit, offset, after)
+        
+        match = build_fts_query(query)
+        if not match:
+            return []
+        
+        conn = self.connect()
+        cursor = conn.cursor()
+        
+        params = [SNIPPET_OPEN, SNIPPET_CLOSE, match]
+        keyset = ""
+        if after:
+            keyset = "AND (a.scrape_timestamp, a.id) < (?, ?)"
+            params.extend(after)
+            offset = 0
+            sort = 'recent'
+        params.extend([limit, offset])
+        order = "a.scrape_timestamp DESC, a.id DESC" if sort == 'recent' else "rank, a.scrape_timestamp DESC"
+        
+        cursor.execute(f'''
+        SELECT a.*, bm25(articles_fts, {SEARCH_TITLE_WEIGHT}, 1.0) AS rank,
+               snippet(articles_fts, -1, ?, ?, '...', 24) AS snippet
+        FROM articles_fts JOIN articles a ON a.seq = articles_fts.rowid
+        WHERE articles_fts MATCH ? {keyset}
+        ORDER BY {order}
+        LIMIT ? OFFSET ?
+        ''', params)
+        
+        results = [dict(row) for row in cursor.fetchall()]
+        for article in results:
+            article['snippet'] = highlight_snippet(article['snippet'])
+        return results
+
+    def _search_articles_like(self, query, limit=10, offset=0, after=None):
+        """Search titles and content with LIKE, newest first (no full-text index)"""
         conn = self.connect()
         cursor = conn.cursor()
         
         # Search in title and content
         search_term = f"%{query}%"
-        cursor.execute('''
+        params = [search_term, search_term]
+        keyset = ""
+        if after:
+            keyset = "AND (scrape_timestamp, id) < (?, ?)"
+            params.extend(after)
+            offset = 0
+        params.extend([limit, offset])
+        cursor.execute(f'''
         SELECT * FROM articles 
-        WHERE title LIKE ? OR content LIKE ? 
-        ORDER BY scrape_timestamp DESC
+        WHERE (title LIKE ? OR content LIKE ?) {keyset}
+        ORDER BY scrape_timestamp DESC, id DESC
         LIMIT ? OFFSET ?
-        ''', (search_term, search_term, limit, offset))
+        ''', params)
         
         return [dict(row) for row in cursor.fetchall()]
+
+    def get_source_health(self, source_name=None):
+        """Get circuit breaker state for one source, or a list for all sources"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        
+        if source_name:
+            cursor.execute("SELECT * FROM source_health WHERE source_name = ?", (source_name,))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        
+        cursor.execute("SELECT * FROM source_health ORDER BY source_name")
+        return [dict(row) for row in cursor.fetchall()]
+
+    def save_source_health(self, health):
+        """Insert or replace the circuit breaker state for a source"""
+        conn = self.connect()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+        INSERT OR REPLACE INTO source_health (
+            source_name, state, consecutive_failures, opened_at, last_success, last_failure, last_error
+        ) VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', (
+            health['source_name'],
+            health.get('state', 'closed'),
+            health.get('consecutive_failures', 0),
+            health.get('opened_at'),
+            health.get('last_success'),
+            health.get('last_failure'),
+            health.get('last_error')
+        ))
+        conn.commit()
+
+if __name__ == "__main__":
+    import argparse
+    
+    parser = argparse.ArgumentParser(description='News database maintenance')
+    parser.add_argument('--db', type=str, default='news.db', help='Database file (default: news.db)')
+    parser.add_argument('--rebuild-search-index', action='store_true',
+                        help='Rebuild the full-text search index from the articles table')
+    args = parser.parse_args()
+    
+    db = NewsDatabase(args.db)
+    if args.rebuild_search_index:
+        if not db.fts_enabled:
+            print("This SQLite build has no FTS5 support; search uses LIKE instead")
+            sys.exit(1)
+        count = db.rebuild_search_index()
+        print(f"Rebuilt search index for {count} articles")
+    else:
+        parser.print_help()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Sharded exports.
+
+Alongside gaming_news.json, each export writes one file per source
+(exports/sources/<slug>.json) and one per scrape day
+(exports/days/YYYY-MM-DD.json), plus exports/manifest.json listing every
+shard with its ETag (content hash) and article count. A shard is only
+rewritten when its content hash changes, so clients and caches that only
+follow one outlet or one day can fetch a small file that rarely changes.
+An incremental export splices its new articles into the front of a source
+shard (splice_shard) instead of rebuilding it from the database.
+"""
+import os
+import re
+import json
+import hashlib
+import textwrap
+from datetime import datetime
+from atomic_files import atomic_write
+
+EXPORTS_DIR = "exports"
+SOURCES_DIR = os.path.join(EXPORTS_DIR, "sources")
+DAYS_DIR = os.path.join(EXPORTS_DIR, "days")
+MANIFEST_FILE = os.path.join(EXPORTS_DIR, "manifest.json")
+
+# A shard is json.dumps(indent=4) output with the article list last
+ARTICLES_OPEN = b'    "articles": [\n'
+SHARD_TAIL = b'\n    ]\n}'
+
+
+def source_slug(source_name):
+    """
+    File name stem for a source, e.g. 'PC Gamer' -> 'pc-gamer'. Names with
+    anything but letters, digits and single spaces get a hash of the name
+    appended ('IGN!!' -> 'ign-<hash>'), so two sources never share a shard
+    """
+    slug = re.sub(r'[^a-z0-9]+', '-', source_name.lower()).strip('-') or 'unknown'
+    if not re.fullmatch(r'[A-Za-z0-9]+( [A-Za-z0-9]+)*', source_name):
+        slug += '-' + hashlib.sha256(source_name.encode('utf-8')).hexdigest()[:8]
+    return slug
+
+
+def source_shard_path(source_name):
+    return os.path.join(SOURCES_DIR, f"{source_slug(source_name)}.json")
+
+
+def day_shard_path(day):
+    return os.path.join(DAYS_DIR, f"{day}.json")
+
+
+def load_manifest():
+    """The current manifest, or an empty one"""
+    if os.path.exists(MANIFEST_FILE):
+        try:
+            with open(MANIFEST_FILE, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            manifest.setdefault("sources", {})
+            manifest.setdefault("days", {})
+            return manifest
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Warning: Could not read export manifest: {e}")
+    return {"sources": {}, "days": {}}
+
+
+def write_shard(path, key, value, articles, previous_entry=None):
+    """
+    Write one shard unless its content is unchanged
+
+    Args:
+        path (str): Shard file path
+        key (str): 'source' or 'day'
+        value (str): The source name or day the shard holds
+        articles (list): Formatted articles, newest first
+        previous_entry (dict): The shard's manifest entry from the last export, if any
+
+    Returns:
+        tuple: (manifest entry, True if the file was rewritten)
+    """
+    data = {key: value, "article_count": len(articles), "articles": articles}
+    content = json.dumps(data, ensure_ascii=False, indent=4).encode('utf-8')
+    etag = hashlib.sha256(content).hexdigest()[:32]
+
+    entry = {
+        key: value,
+        "path": path.replace(os.sep, '/'),
+        "etag": etag,
+        "article_count": len(articles),
+        "size": len(content)
+    }
+    if previous_entry and previous_entry.get("etag") == etag and os.path.exists(path):
+        entry["updated_at"] = previous_entry.get("updated_at")
+        return entry, False
+
+    with atomic_write(path, 'wb') as f:
+        f.write(content)
+    entry["updated_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    return entry, True
+
+
+def splice_shard(path, key, value, new_articles, previous_entry):
+    """
+    Add articles newer than every article in a shard to its front without
+    rebuilding it: the header is rewritten and the existing articles are
+    copied as raw bytes from the open previous file
+
+    Returns:
+        dict: The new manifest entry, or None if the file isn't the shard
+        previous_entry describes and has to be rebuilt
+    """
+    if not previous_entry or not previous_entry.get("size"):
+        return None
+    try:
+        previous = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    with previous:
+        size = os.fstat(previous.fileno()).st_size
+        head = previous.read(4096)
+        previous.seek(max(0, size - len(SHARD_TAIL)))
+        tail = previous.read()
+        start = head.find(ARTICLES_OPEN)
+        if size != previous_entry["size"] or start < 0 or tail != SHARD_TAIL:
+            return None
+        previous.seek(start + len(ARTICLES_OPEN))
+
+        article_count = previous_entry["article_count"] + len(new_articles)
+        header = json.dumps({key: value, "article_count": article_count}, ensure_ascii=False, indent=4)
+        digest = hashlib.sha256()
+        with atomic_write(path, 'wb') as f:
+            def write(data):
+                f.write(data)
+                digest.update(data)
+
+            # The header without its closing '\n}', then the new articles
+            write(header[:-2].encode('utf-8') + b',\n' + ARTICLES_OPEN)
+            for article in new_articles:
+                write(textwrap.indent(json.dumps(article, ensure_ascii=False, indent=4), ' ' * 8).encode('utf-8') + b',\n')
+            for chunk in iter(lambda: previous.read(1024 * 1024), b''):
+                write(chunk)
+            size = f.tell()
+
+    return {
+        key: value,
+        "path": path.replace(os.sep, '/'),
+        "etag": digest.hexdigest()[:32],
+        "article_count": article_count,
+        "size": size,
+        "updated_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    }
+
+
+def remove_shards(entries):
+    """Delete the files of shards that no longer exist"""
+    for entry in entries:
+        try:
+            os.remove(entry["path"])
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing export shard {entry['path']}: {e}")
+
+
+def save_manifest(manifest):
+    with atomic_write(MANIFEST_FILE) as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=4)
@@ -8,6 +8,7 @@ import json
 from datetime import datetime
 import uuid
 import hashlib
+from atomic_files import atomic_write
 
 def get_fallback_articles():
     """Return a list of fallback gaming news articles"""
@@ -166,7 +167,7 @@ def save_fallback_data(output_file='gaming_news.json'):
     for article in articles:
         content_path = article.get('local_content_path')
         if content_path:
-            with open(content_path, 'w', encoding='utf-8') as f:
+            with atomic_write(content_path, durable=False) as f:
                 f.write(article['content'])
     
     # Create JSON structure
@@ -178,7 +179,7 @@ def save_fallback_data(output_file='gaming_news.json'):
     }
     
     # Save to JSON file
-    with open(output_file, 'w', encoding='utf-8') as f:
+    with atomic_write(output_file) as f:
         json.dump(data, f, ensure_ascii=False, indent=4)
     
     return len(articles)
@@ -0,0 +1,594 @@
+#!/usr/bin/env python3
+"""
+Shared HTTP session layer used by the scrapers.
+
+Every host gets its own pooled, keep-alive requests.Session so that listing
+pages, article pages and images fetched from the same site reuse open
+TCP/TLS connections instead of paying a fresh handshake on every call.
+"""
+import io
+import os
+import gzip
+import json
+import time
+import random
+import hashlib
+import threading
+import requests
+from email.utils import parsedate_to_datetime
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from urllib.parse import urlparse
+from atomic_files import atomic_write
+
+# Number of connections kept alive per host (override with HTTP_POOL_SIZE)
+POOL_SIZE = int(os.environ.get('HTTP_POOL_SIZE', 10))
+
+# Default timeout in seconds for every request
+DEFAULT_TIMEOUT = 10
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
+}
+
+# Where ETag / Last-Modified validators for listing pages are persisted
+VALIDATOR_CACHE_FILE = os.environ.get('HTTP_VALIDATOR_CACHE', 'http_validators.json')
+
+# Validators older than this (seconds) are ignored so every listing page gets a full refetch now and then
+VALIDATOR_MAX_AGE = int(os.environ.get('HTTP_VALIDATOR_MAX_AGE', 24 * 60 * 60))
+
+# Politeness limits applied to every host
+HOST_RATE = float(os.environ.get('HTTP_HOST_RPS', 2.0))
+HOST_BURST = int(os.environ.get('HTTP_HOST_BURST', 4))
+HOST_MAX_IN_FLIGHT = int(os.environ.get('HTTP_HOST_MAX_IN_FLIGHT', 4))
+
+# Longest wait (seconds) for one of a host's in-flight slots before the fetch fails
+HOST_SLOT_TIMEOUT = float(os.environ.get('HTTP_HOST_SLOT_TIMEOUT', 60))
+
+# Backoff applied to a host answering 429/503 (seconds); Retry-After wins when present
+THROTTLE_BACKOFF = 5
+MAX_THROTTLE_BACKOFF = int(os.environ.get('HTTP_MAX_BACKOFF', 300))
+THROTTLE_STATUSES = (429, 503)
+
+# Request-level retries: only idempotent methods are retried, with
+# exponential backoff and full jitter, and never more than the run's budget
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS')
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_EXCEPTIONS = (
+    requests.exceptions.ConnectionError,
+    requests.exceptions.Timeout,
+    requests.exceptions.ChunkedEncodingError
+)
+MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 3))
+RETRY_BASE_DELAY = float(os.environ.get('HTTP_RETRY_BASE_DELAY', 0.5))
+RETRY_MAX_DELAY = 30
+RETRY_BUDGET = int(os.environ.get('HTTP_RETRY_BUDGET', 200))
+
+# Optional on-disk cache of page bodies (enable with HTTP_CACHE=1)
+RESPONSE_CACHE_ENABLED = os.environ.get('HTTP_CACHE', '0') == '1'
+RESPONSE_CACHE_DIR = os.environ.get('HTTP_CACHE_DIR', 'http_cache')
+RESPONSE_CACHE_TTL = int(os.environ.get('HTTP_CACHE_TTL', 60 * 60))
+RESPONSE_CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 200 * 1024 * 1024))
+
+# Response headers kept alongside cached bodies
+CACHED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _host_key(url):
+    """Return the scheme://host key used to look up the session for a URL"""
+    parsed = urlparse(url)
+    return f"{parsed.scheme}://{parsed.netloc.lower()}"
+
+
+def get_session(url):
+    """
+    Return the shared session for the host of the given URL, creating it on first use.
+    requests.Session is safe to share between threads for plain GET requests;
+    the registry itself is guarded by a lock.
+    """
+    key = _host_key(url)
+    session = _sessions.get(key)
+    if session is not None:
+        return session
+
+    with _sessions_lock:
+        session = _sessions.get(key)
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE)
+            session.mount('http://', adapter)
+            session.mount('https://', adapter)
+            session.headers.update(DEFAULT_HEADERS)
+            _sessions[key] = session
+    return session
+
+
+def close_sessions():
+    """Close every pooled session and forget them"""
+    with _sessions_lock:
+        for session in _sessions.values():
+            try:
+                session.close()
+            except Exception as e:
+                print(f"Error closing HTTP session: {e}")
+        _sessions.clear()
+
+
+class RetryBudget:
+    """Caps the total number of retries across one scraping run"""
+    def __init__(self, total=RETRY_BUDGET):
+        self.total = total
+        self.remaining = total
+        self._lock = threading.Lock()
+        self._exhausted_reported = False
+
+    def spend(self):
+        """Take one retry from the budget; False once it is used up"""
+        with self._lock:
+            if self.remaining > 0:
+                self.remaining -= 1
+                return True
+            if not self._exhausted_reported:
+                self._exhausted_reported = True
+                print(f"Retry budget of {self.total} exhausted, failing fast from now on")
+            return False
+
+    def reset(self, total=None):
+        with self._lock:
+            if total is not None:
+                self.total = total
+            self.remaining = self.total
+            self._exhausted_reported = False
+
+
+retry_budget = RetryBudget()
+
+
+def reset_retry_budget(total=None):
+    """Refill the retry budget at the start of a run"""
+    retry_budget.reset(total)
+
+
+def _release_on_close(response, limiter):
+    """Release the host's in-flight slot exactly once, when the response is closed"""
+    original_close = response.close
+    released = []
+
+    def close():
+        try:
+            original_close()
+        finally:
+            if not released:
+                released.append(True)
+                limiter.release()
+
+    response.close = close
+
+
+def parse_retry_after(value):
+    """Turn a Retry-After header (seconds or HTTP date) into a delay in seconds, or None"""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return int(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0, retry_at.timestamp() - time.time())
+
+
+class HostBusy(requests.exceptions.RequestException):
+    """Raised when a host's in-flight slots stay taken for longer than HOST_SLOT_TIMEOUT"""
+
+
+class HostLimiter:
+    """
+    Token bucket plus in-flight cap for a single host. A host that answers
+    429/503 is paused for Retry-After seconds, or an exponentially growing
+    backoff when the header is missing.
+    """
+    def __init__(self, host, rate=HOST_RATE, burst=HOST_BURST, max_in_flight=HOST_MAX_IN_FLIGHT,
+                 slot_timeout=HOST_SLOT_TIMEOUT):
+        self.host = host
+        self.rate = rate
+        self.burst = burst
+        self.slot_timeout = slot_timeout
+        self._in_flight = threading.BoundedSemaphore(max_in_flight)
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._last_refill = time.monotonic()
+        self._blocked_until = 0.0
+        self._throttle_count = 0
+
+    def _reserve(self):
+        """Take a token if one is available; otherwise return how long to wait"""
+        with self._lock:
+            now = time.monotonic()
+            if now < self._blocked_until:
+                return self._blocked_until - now
+            if self.rate <= 0:
+                return 0
+            self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def _blocked_for(self):
+        """Seconds left on a 429/503 pause, or 0"""
+        with self._lock:
+            return max(0.0, self._blocked_until - time.monotonic())
+
+    def acquire(self):
+        """
+        Block until this host may receive another request; raises HostBusy if
+        no slot frees up in time. Pauses and token waits happen without a
+        slot held, so threads sitting out a long Retry-After don't starve
+        fetches that could use the slots afterwards
+        """
+        while True:
+            wait = self._blocked_for()
+            if wait > 0:
+                time.sleep(wait)
+                continue
+            if not self._in_flight.acquire(timeout=self.slot_timeout):
+                raise HostBusy(f"No free connection slot for {self.host} after {self.slot_timeout:.0f}s")
+            try:
+                wait = self._reserve()
+            except BaseException:
+                self._in_flight.release()
+                raise
+            if wait <= 0:
+                return
+            self._in_flight.release()
+            time.sleep(wait)
+
+    def release(self):
+        self._in_flight.release()
+
+    def throttle(self, retry_after=None):
+        """Pause the host after a 429/503"""
+        delay = parse_retry_after(retry_after)
+        with self._lock:
+            self._throttle_count += 1
+            if delay is None:
+                delay = THROTTLE_BACKOFF * (2 ** (self._throttle_count - 1))
+                delay += random.uniform(0, delay / 2)
+            delay = min(delay, MAX_THROTTLE_BACKOFF)
+            self._blocked_until = max(self._blocked_until, time.monotonic() + delay)
+        print(f"{self.host} is throttling us, backing off for {delay:.0f}s")
+
+    def clear_throttle(self):
+        with self._lock:
+            self._throttle_count = 0
+
+
+class RateLimiter:
+    """Registry of per-host limiters shared by every fetch"""
+    def __init__(self):
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def for_url(self, url):
+        host = urlparse(url).netloc.lower()
+        with self._lock:
+            limiter = self._limiters.get(host)
+            if limiter is None:
+                limiter = HostLimiter(host)
+                self._limiters[host] = limiter
+        return limiter
+
+
+rate_limiter = RateLimiter()
+
+
+class CacheMiss(requests.exceptions.RequestException):
+    """Raised in replay mode when a URL is not in the response cache"""
+
+
+def _send(method, url, headers, stream, timeout):
+    """Send a single request within the host's rate limit"""
+    limiter = rate_limiter.for_url(url)
+    limiter.acquire()
+    try:
+        session = get_session(url)
+        response = session.request(method, url, headers=headers, stream=stream, timeout=timeout)
+    except Exception:
+        limiter.release()
+        raise
+
+    if response.status_code in THROTTLE_STATUSES:
+        limiter.throttle(response.headers.get('Retry-After'))
+    else:
+        limiter.clear_throttle()
+
+    if stream:
+        # A streamed body is still in flight until the caller closes the response
+        _release_on_close(response, limiter)
+    else:
+        limiter.release()
+    return response
+
+
+def _retry_delay(attempt):
+    """Exponential backoff with full jitter"""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** attempt)))
+
+
+def fetch(url, headers=None, stream=False, timeout=DEFAULT_TIMEOUT, cache=False, method='GET', retries=None):
+    """
+    GET a URL through the pooled session for its host, within that host's
+    rate limit and in-flight cap. Connection errors, timeouts and 429/5xx
+    answers are retried with backoff for idempotent methods while the run's
+    retry budget lasts; pass retries=0 to send exactly one request.
+    Raises requests.exceptions.RequestException on failure, like requests.get.
+    
+    With cache=True the body is served from / stored in the on-disk response
+    cache when it is enabled. In replay mode every fetch is served from the
+    cache and never touches the network.
+    """
+    if response_cache.replay:
+        cached = response_cache.get(url, ignore_ttl=True)
+        if cached is None:
+            raise CacheMiss(f"Not in response cache (replay mode): {url}")
+        return cached
+
+    use_cache = cache and response_cache.enabled and not stream
+    if use_cache:
+        cached = response_cache.get(url)
+        if cached is not None:
+            return cached
+
+    can_retry = method.upper() in IDEMPOTENT_METHODS
+    max_retries = MAX_RETRIES if retries is None else retries
+    attempt = 0
+    while True:
+        try:
+            response = _send(method, url, headers, stream, timeout)
+        except RETRY_EXCEPTIONS as e:
+            if not (can_retry and attempt < max_retries and retry_budget.spend()):
+                raise
+            delay = _retry_delay(attempt)
+            print(f"Retrying {url} in {delay:.1f}s after error: {e}")
+        else:
+            if response.status_code not in RETRY_STATUSES:
+                break
+            if not (can_retry and attempt < max_retries and retry_budget.spend()):
+                break
+            delay = _retry_delay(attempt)
+            print(f"Retrying {url} in {delay:.1f}s after HTTP {response.status_code}")
+            response.close()
+        attempt += 1
+        time.sleep(delay)
+
+    if use_cache and response.status_code == 200:
+        response_cache.put(url, response)
+    return response
+
+
+class ValidatorCache:
+    """
+    Persistent cache of ETag / Last-Modified validators keyed by URL.
+    Validators seen on a fresh response are staged first and only committed
+    once the caller has confirmed the page was actually useful, so a 304 on
+    a later run can safely short-circuit discovery for that page.
+    """
+    def __init__(self, path=VALIDATOR_CACHE_FILE, max_age=VALIDATOR_MAX_AGE):
+        self.path = path
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._entries = None
+        self._pending = {}
+
+    def _load(self):
+        """Load the cache file on first use"""
+        if self._entries is not None:
+            return
+        self._entries = {}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, 'r', encoding='utf-8') as f:
+                    self._entries = json.load(f)
+            except (json.JSONDecodeError, OSError) as e:
+                print(f"Warning: Could not read validator cache {self.path}: {e}")
+
+    def _save(self):
+        """Write the cache file atomically"""
+        try:
+            with atomic_write(self.path) as f:
+                json.dump(self._entries, f, indent=4)
+        except OSError as e:
+            print(f"Error saving validator cache {self.path}: {e}")
+
+    def conditional_headers(self, url):
+        """Return If-None-Match / If-Modified-Since headers for a URL, if we have fresh validators"""
+        with self._lock:
+            self._load()
+            entry = self._entries.get(url)
+        if not entry or time.time() - entry.get('stored_at', 0) > self.max_age:
+            return {}
+
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def stage(self, url, response):
+        """Remember the validators of a 200 response until commit() is called"""
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        entry = None
+        if etag or last_modified:
+            entry = {
+                'etag': etag,
+                'last_modified': last_modified,
+                'stored_at': time.time()
+            }
+        with self._lock:
+            # None means the page stopped sending validators, so commit() drops the old ones
+            self._pending[url] = entry
+
+    def commit(self, url):
+        """Persist the staged validators for a URL"""
+        with self._lock:
+            if url not in self._pending:
+                return
+            entry = self._pending.pop(url)
+            self._load()
+            if entry is None:
+                if self._entries.pop(url, None) is None:
+                    return
+            else:
+                self._entries[url] = entry
+            self._save()
+
+    def discard(self, url):
+        """Forget the staged validators for a URL"""
+        with self._lock:
+            self._pending.pop(url, None)
+
+
+validator_cache = ValidatorCache()
+
+
+class ResponseCache:
+    """
+    On-disk cache of raw response bodies, keyed by a hash of the URL and
+    stored gzip-compressed. Entries expire after a TTL, and the oldest-used
+    entries are evicted once the cache grows past its size limit.
+    """
+    def __init__(self, cache_dir=RESPONSE_CACHE_DIR, ttl=RESPONSE_CACHE_TTL,
+                 max_bytes=RESPONSE_CACHE_MAX_BYTES, enabled=RESPONSE_CACHE_ENABLED):
+        self.cache_dir = cache_dir
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.replay = False
+        self._lock = threading.Lock()
+        self._total_bytes = None
+
+    def _path(self, url):
+        key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, key[:2], f"{key}.gz")
+
+    def get(self, url, ignore_ttl=False):
+        """Return a cached requests.Response for the URL, or None"""
+        path = self._path(url)
+        try:
+            with gzip.open(path, 'rb') as f:
+                meta = json.loads(f.readline())
+                body = f.read()
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Warning: Discarding unreadable cache entry for {url}: {e}")
+            return None
+
+        if not ignore_ttl and time.time() - meta.get('stored_at', 0) > self.ttl:
+            return None
+
+        # Touch the file so eviction treats it as recently used
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+
+        response = requests.Response()
+        response.status_code = meta.get('status', 200)
+        response.url = url
+        response.headers = CaseInsensitiveDict(meta.get('headers', {}))
+        # Back the body with a raw stream so close(), iter_content() and
+        # "with" work as they do on a fetched response
+        response.raw = io.BytesIO(body)
+        response._content = body
+        response._content_consumed = True
+        return response
+
+    def put(self, url, response):
+        """Store the body of a 200 response"""
+        meta = {
+            'url': url,
+            'status': response.status_code,
+            'stored_at': time.time(),
+            'headers': {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        }
+        path = self._path(url)
+        try:
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            # A failed write removes its temp file and leaves any old entry in place
+            with atomic_write(path, 'wb', durable=False) as f, gzip.GzipFile(fileobj=f, mode='wb') as gz:
+                gz.write(json.dumps(meta).encode('utf-8') + b'\n')
+                gz.write(response.content)
+        except OSError as e:
+            print(f"Error writing response cache entry for {url}: {e}")
+            return
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += os.path.getsize(path) - old_size
+            if self._total_bytes > self.max_bytes:
+                self._evict()
+
+    def _entries(self):
+        """List (mtime, size, path) for every cache file"""
+        entries = []
+        if not os.path.isdir(self.cache_dir):
+            return entries
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if not name.endswith('.gz'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def _scan_size(self):
+        return sum(size for _, size, _ in self._entries())
+
+    def _evict(self):
+        """Remove least recently used entries until the cache is back under 90% of its limit"""
+        target = self.max_bytes * 0.9
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError as e:
+                print(f"Error evicting cache entry {path}: {e}")
+        self._total_bytes = total
+
+
+response_cache = ResponseCache()
+
+
+def configure_response_cache(enabled=True, replay=False, cache_dir=None, ttl=None, max_bytes=None):
+    """
+    Turn the on-disk response cache on or off. Replay mode serves every fetch
+    from the cache (ignoring the TTL) and fails fast on anything not cached.
+    """
+    response_cache.enabled = enabled or replay
+    response_cache.replay = replay
+    if cache_dir is not None:
+        response_cache.cache_dir = cache_dir
+        response_cache._total_bytes = None
+    if ttl is not None:
+        response_cache.ttl = ttl
+    if max_bytes is not None:
+        response_cache.max_bytes = max_bytes
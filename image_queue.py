@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Background image download queue.
+
+Each scraping run creates its own queue and attaches it to its scrapers
+(BaseScraper.image_queue), and create_article_object hands their image
+downloads to its bounded pool of worker threads instead of downloading
+inline. Runs that overlap never share or shut down each other's queue. Articles come
+back with image_status 'pending' and are filled in (local_image_path,
+github_image_url, image_status) once their download finishes, so article
+parsing is no longer held up by image bandwidth.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+
+# Number of concurrent image downloads
+MAX_WORKERS = int(os.environ.get('IMAGE_DOWNLOAD_WORKERS', 4))
+
+# Maximum number of queued downloads before submit() blocks the scraper
+MAX_PENDING = int(os.environ.get('IMAGE_QUEUE_SIZE', 200))
+
+GITHUB_RAW_BASE = "https://raw.githubusercontent.com/solariscodes/newsrepo/master"
+
+PENDING = 'pending'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class ImageDownloadQueue:
+    def __init__(self, max_workers=MAX_WORKERS, max_pending=MAX_PENDING):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-download')
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._futures = set()
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def add_listener(self, callback):
+        """Register callback(article) to be called after each download completes"""
+        self._listeners.append(callback)
+
+    def submit(self, article):
+        """Queue the image download for an article; blocks while the queue is full"""
+        self._slots.acquire()
+        try:
+            future = self._executor.submit(self._download, article)
+        except Exception:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._futures.add(future)
+        future.add_done_callback(self._forget)
+        return future
+
+    def _forget(self, future):
+        with self._lock:
+            self._futures.discard(future)
+
+    def _download(self, article):
+        from utils import download_image
+
+        try:
+            local_image_path = download_image(article.get('image_url', ''), article.get('source_name', ''),
+                                              article.get('title', ''), article.get('id'))
+        except Exception as e:
+            print(f"Error downloading image for {article.get('source_url')}: {e}")
+            local_image_path = ""
+        finally:
+            self._slots.release()
+
+        article['local_image_path'] = local_image_path
+        article['github_image_url'] = f"{GITHUB_RAW_BASE}/{local_image_path}" if local_image_path else ""
+        article['image_status'] = READY if local_image_path else FAILED
+
+        for callback in self._listeners:
+            try:
+                callback(article)
+            except Exception as e:
+                print(f"Error in image download listener: {e}")
+        return local_image_path
+
+    def join(self, timeout=None):
+        """Wait until every queued download has finished"""
+        with self._lock:
+            futures = list(self._futures)
+        if futures:
+            wait(futures, timeout=timeout)
+
+    def shutdown(self, wait_for_downloads=True):
+        self._executor.shutdown(wait=wait_for_downloads)
+
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Streaming image validation.
+
+Checks a downloaded image while it streams to disk instead of trusting the
+response headers: the format is sniffed from the magic bytes, the real
+dimensions are read from the image header, the byte count is tallied as
+chunks arrive and the download is aborted as soon as it passes the size cap.
+"""
+import os
+import struct
+
+# Anything smaller than this is probably an icon or tracking pixel
+MIN_IMAGE_BYTES = 5000
+
+# Downloads larger than this are aborted mid-stream
+MAX_IMAGE_BYTES = int(os.environ.get('IMAGE_MAX_BYTES', 15 * 1024 * 1024))
+
+# Images narrower or shorter than this are treated as icons or logos
+MIN_IMAGE_DIMENSION = 100
+
+# How much of the file we are willing to buffer while looking for the dimensions
+MAX_HEADER_BYTES = 256 * 1024
+
+# File extension used for each sniffed format
+EXTENSIONS = {'jpeg': '.jpg', 'png': '.png', 'gif': '.gif', 'webp': '.webp'}
+
+# JPEG start-of-frame markers that carry the image size
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+
+class InvalidImage(Exception):
+    """The downloaded data is not an acceptable image"""
+
+
+def sniff_format(data):
+    """Return 'jpeg', 'png', 'gif' or 'webp' from the leading bytes, or None"""
+    if data.startswith(b'\xff\xd8\xff'):
+        return 'jpeg'
+    if data.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if data.startswith((b'GIF87a', b'GIF89a')):
+        return 'gif'
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+
+def _jpeg_dimensions(data):
+    position = 2
+    while position + 4 <= len(data):
+        if data[position] != 0xFF:
+            return None
+        marker = data[position + 1]
+        if marker == 0xFF:
+            # Fill byte
+            position += 1
+            continue
+        if marker in (0x01,) or 0xD0 <= marker <= 0xD9:
+            # Markers without a length field
+            position += 2
+            continue
+        segment_length = struct.unpack('>H', data[position + 2:position + 4])[0]
+        if marker in JPEG_SOF_MARKERS:
+            if position + 9 > len(data):
+                return None
+            height, width = struct.unpack('>HH', data[position + 5:position + 9])
+            return width, height
+        position += 2 + segment_length
+    return None
+
+
+def _webp_dimensions(data):
+    chunk = data[12:16]
+    if chunk == b'VP8 ' and len(data) >= 30:
+        width, height = struct.unpack('<HH', data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b'VP8L' and len(data) >= 25:
+        bits = struct.unpack('<I', data[21:25])[0]
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b'VP8X' and len(data) >= 30:
+        width = int.from_bytes(data[24:27], 'little') + 1
+        height = int.from_bytes(data[27:30], 'little') + 1
+        return width, height
+    return None
+
+
+def parse_dimensions(image_format, data):
+    """Return (width, height) from the image header, or None if more bytes are needed"""
+    if image_format == 'png' and len(data) >= 24:
+        return struct.unpack('>II', data[16:24])
+    if image_format == 'gif' and len(data) >= 10:
+        return struct.unpack('<HH', data[6:10])
+    if image_format == 'jpeg':
+        return _jpeg_dimensions(data)
+    if image_format == 'webp':
+        return _webp_dimensions(data)
+    return None
+
+
+def save_stream(chunks, file_path, max_bytes=MAX_IMAGE_BYTES):
+    """
+    Write an image stream to file_path, validating it on the way
+
+    Args:
+        chunks (iterable): Byte chunks, e.g. response.iter_content(8192)
+        file_path (str): Where to write; callers should pass a temp path and rename on success
+        max_bytes (int): Abort once the stream grows past this many bytes
+
+    Returns:
+        dict: format, width, height and size of the saved image
+
+    Raises:
+        InvalidImage: if the data is not a supported image, too small, or too large
+    """
+    header = b''
+    image_format = None
+    dimensions = None
+    size = 0
+
+    with open(file_path, 'wb') as f:
+        for chunk in chunks:
+            if not chunk:
+                continue
+            size += len(chunk)
+            if size > max_bytes:
+                raise InvalidImage(f"larger than {max_bytes} bytes")
+
+            if dimensions is None and len(header) < MAX_HEADER_BYTES:
+                header += chunk
+                if image_format is None and len(header) >= 12:
+                    image_format = sniff_format(header)
+                    if image_format is None:
+                        raise InvalidImage("unrecognised file signature")
+                if image_format:
+                    dimensions = parse_dimensions(image_format, header)
+                    if dimensions and min(dimensions) < MIN_IMAGE_DIMENSION:
+                        raise InvalidImage(f"too small ({dimensions[0]}x{dimensions[1]})")
+
+            f.write(chunk)
+        f.flush()
+        os.fsync(f.fileno())
+
+    if image_format is None:
+        image_format = sniff_format(header)
+        if image_format is None:
+            raise InvalidImage("unrecognised file signature")
+    if size < MIN_IMAGE_BYTES:
+        raise InvalidImage(f"too small ({size} bytes)")
+
+    width, height = dimensions or (None, None)
+    return {"format": image_format, "width": width, "height": height, "size": size}
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Content-addressed image store.
+
+Files live under images/store/<aa>/<sha256><ext>, named after the SHA-256 of
+their bytes, so identical images are only ever stored once. Fallback images
+are fetched into the store once and every article that needs one simply
+references the stored path. The database keeps a reference count per stored
+file (see NewsDatabase.collect_image_garbage) so unused files can be removed.
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+import http_client
+import image_sniff
+from atomic_files import atomic_write
+
+IMAGES_DIR = "images"
+STORE_DIR = os.path.join(IMAGES_DIR, "store")
+
+# Maps fallback image URLs to their stored path so they are only downloaded once
+FALLBACK_INDEX_FILE = os.path.join(STORE_DIR, "fallback_index.json")
+
+# Leftover temp files and unreferenced files younger than this (seconds) are never collected,
+# so a download that hasn't been linked to its article yet is safe
+GC_GRACE_PERIOD = 60 * 60
+
+# A fallback image that failed to download is retried after this many seconds
+FALLBACK_RETRY_INTERVAL = 10 * 60
+
+_STORE_PATH_RE = re.compile(r'^images/store/[0-9a-f]{2}/([0-9a-f]{64})\.[a-z]+$')
+
+_index_lock = threading.Lock()
+_fallback_index = None
+_failed_fallbacks = {}
+_url_locks = {}
+
+
+def blob_path(digest, extension=".jpg"):
+    """Relative path of the stored file for a content hash"""
+    return f"{IMAGES_DIR}/store/{digest[:2]}/{digest}{extension}"
+
+
+def digest_from_path(local_path):
+    """Content hash of a stored file from its relative path, or None for paths outside the store"""
+    if not local_path:
+        return None
+    match = _STORE_PATH_RE.match(local_path.replace(os.sep, '/'))
+    return match.group(1) if match else None
+
+
+def hash_file(path):
+    """SHA-256 hex digest of a file's contents"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def store_file(temp_path, extension=".jpg"):
+    """
+    Move a fully written temp file into the store under its content hash.
+    If an identical file is already stored the temp file is dropped.
+    Returns the relative path of the stored file.
+    """
+    digest = hash_file(temp_path)
+    relative_path = blob_path(digest, extension)
+    target = os.path.join(os.getcwd(), relative_path)
+    if os.path.exists(target):
+        os.remove(temp_path)
+        # Refresh the timestamp so garbage collection sees the file as recently used
+        os.utime(target)
+    else:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(temp_path, target)
+    return relative_path
+
+
+def new_temp_path(prefix="download"):
+    """Temp file path inside the store, so the final rename stays on one filesystem"""
+    store_dir = os.path.join(os.getcwd(), STORE_DIR)
+    os.makedirs(store_dir, exist_ok=True)
+    return os.path.join(store_dir, f".{prefix}-{threading.get_ident()}-{os.urandom(4).hex()}.tmp")
+
+
+def iter_stored_files():
+    """Yield (relative_path, digest, mtime) for every file in the store, including stale temp files"""
+    store_dir = os.path.join(os.getcwd(), STORE_DIR)
+    if not os.path.isdir(store_dir):
+        return
+    for root, _, files in os.walk(store_dir):
+        for name in files:
+            full_path = os.path.join(root, name)
+            relative_path = os.path.relpath(full_path, os.getcwd()).replace(os.sep, '/')
+            try:
+                mtime = os.path.getmtime(full_path)
+            except OSError:
+                continue
+            yield relative_path, digest_from_path(relative_path), mtime
+
+
+def remove_unreferenced(referenced_digests):
+    """
+    Delete stored files whose digest is not in referenced_digests, plus stale
+    temp files. Fallback assets are kept, and so is anything younger than the
+    grace period. Returns the number of files removed.
+    """
+    with _index_lock:
+        keep = {digest_from_path(path) for path in _load_fallback_index().values()}
+    cutoff = time.time() - GC_GRACE_PERIOD
+    removed = 0
+    for relative_path, digest, mtime in list(iter_stored_files()):
+        if relative_path == FALLBACK_INDEX_FILE.replace(os.sep, '/') or mtime > cutoff:
+            continue
+        is_temp = relative_path.endswith('.tmp')
+        if not is_temp and (digest is None or digest in referenced_digests or digest in keep):
+            continue
+        try:
+            os.remove(os.path.join(os.getcwd(), relative_path))
+            removed += 1
+        except OSError as e:
+            print(f"Error removing unreferenced image {relative_path}: {e}")
+    return removed
+
+
+def _load_fallback_index():
+    global _fallback_index
+    if _fallback_index is not None:
+        return _fallback_index
+    _fallback_index = {}
+    if os.path.exists(FALLBACK_INDEX_FILE):
+        try:
+            with open(FALLBACK_INDEX_FILE, 'r', encoding='utf-8') as f:
+                _fallback_index = json.load(f)
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"Warning: Could not read fallback image index: {e}")
+    return _fallback_index
+
+
+def _save_fallback_index():
+    try:
+        with atomic_write(FALLBACK_INDEX_FILE) as f:
+            json.dump(_fallback_index, f, indent=4)
+    except OSError as e:
+        print(f"Error saving fallback image index: {e}")
+
+
+def _recently_failed(image_url):
+    """True if the fallback failed within FALLBACK_RETRY_INTERVAL; call with _index_lock held"""
+    failed_at = _failed_fallbacks.get(image_url)
+    if failed_at is None:
+        return False
+    if time.monotonic() - failed_at < FALLBACK_RETRY_INTERVAL:
+        return True
+    del _failed_fallbacks[image_url]
+    return False
+
+
+def get_fallback_asset(image_url):
+    """
+    Return the stored path for a fallback image, downloading it the first time.
+    Returns an empty string if the image can't be fetched; failures are
+    remembered for FALLBACK_RETRY_INTERVAL seconds so they aren't retried per article.
+    """
+    with _index_lock:
+        index = _load_fallback_index()
+        path = index.get(image_url)
+        if path and os.path.exists(path):
+            return path
+        if _recently_failed(image_url):
+            return ""
+        url_lock = _url_locks.setdefault(image_url, threading.Lock())
+
+    # Only one thread downloads a given fallback; the others wait and reuse it
+    with url_lock:
+        with _index_lock:
+            path = _load_fallback_index().get(image_url)
+            if path and os.path.exists(path):
+                return path
+            if _recently_failed(image_url):
+                return ""
+
+        temp_path = new_temp_path("fallback")
+        try:
+            with http_client.fetch(image_url, stream=True) as response:
+                response.raise_for_status()
+                content_type = response.headers.get('Content-Type', '')
+                if not content_type.startswith('image/') or content_type == 'image/svg+xml':
+                    raise ValueError(f"not a supported image format: {content_type}")
+                image_info = image_sniff.save_stream(response.iter_content(chunk_size=8192), temp_path)
+            path = store_file(temp_path, image_sniff.EXTENSIONS[image_info["format"]])
+        except Exception as e:
+            print(f"Error downloading fallback image {image_url}: {e}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            with _index_lock:
+                _failed_fallbacks[image_url] = time.monotonic()
+            return ""
+
+        with _index_lock:
+            _load_fallback_index()[image_url] = path
+            _save_fallback_index()
+        return path
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Responsive image variants.
+
+After a run's downloads finish, every stored image without variants is
+resized to a few fixed widths and saved as JPEG and WebP under
+images/variants/<aa>/<sha256>-<width>.<ext>. Resizing is CPU bound, so it
+runs in a process pool. Variants are recorded in the image_variants table
+against the stored file's digest, which is how articles reference their
+image, and /images/<path>?w=<width> serves the closest one.
+
+Pillow is optional; without it no variants are generated and the originals
+are served as before.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+import image_store
+from atomic_files import atomic_write
+
+VARIANTS_DIR = os.path.join(image_store.IMAGES_DIR, "variants")
+
+# Widths (pixels) to generate; widths at or above the original's are skipped
+VARIANT_WIDTHS = sorted(int(w) for w in os.environ.get('IMAGE_VARIANT_WIDTHS', '320,640,1024').split(',') if w.strip())
+
+# Number of worker processes used for resizing
+MAX_WORKERS = int(os.environ.get('IMAGE_VARIANT_WORKERS', max(1, (os.cpu_count() or 2) - 1)))
+
+# Encoder settings per output format: (file extension, Pillow save options)
+FORMATS = {
+    'jpeg': ('.jpg', {'quality': 80, 'optimize': True, 'progressive': True}),
+    'webp': ('.webp', {'quality': 75, 'method': 4}),
+}
+
+
+def is_available():
+    """True if Pillow is installed and variants can be generated"""
+    return Image is not None
+
+
+def variant_path(digest, width, image_format):
+    """Relative path of a variant file"""
+    extension = FORMATS[image_format][0]
+    return f"{image_store.IMAGES_DIR}/variants/{digest[:2]}/{digest}-{width}{extension}"
+
+
+def render_variants(digest, source_path, widths=None):
+    """
+    Resize one stored image to every width narrower than the original.
+    Runs in a worker process, so it only takes and returns plain values.
+
+    Returns:
+        list: dicts with width, height, format, path and size for each variant written
+    """
+    widths = widths or VARIANT_WIDTHS
+    variants = []
+    with Image.open(source_path) as original:
+        original.load()
+        if original.mode not in ('RGB', 'L'):
+            # Flatten transparency onto white so JPEG output doesn't turn black
+            background = Image.new('RGB', original.size, (255, 255, 255))
+            rgba = original.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+        else:
+            image = original.convert('RGB')
+
+        for width in widths:
+            if width >= image.width:
+                continue
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.LANCZOS)
+            for image_format, (_, options) in FORMATS.items():
+                relative_path = variant_path(digest, width, image_format)
+                target = os.path.join(os.getcwd(), relative_path)
+                with atomic_write(target, 'wb') as f:
+                    resized.save(f, format=image_format.upper(), **options)
+                variants.append({
+                    'width': width,
+                    'height': height,
+                    'format': image_format,
+                    'path': relative_path,
+                    'size': os.path.getsize(target)
+                })
+    return variants
+
+
+def generate(images, max_workers=MAX_WORKERS):
+    """
+    Generate variants for many stored images in a process pool
+
+    Args:
+        images (list): (digest, path) pairs of stored images
+        max_workers (int): Number of worker processes
+
+    Yields:
+        tuple: (digest, variants) for each image processed; variants is empty if it failed
+    """
+    if not images or not is_available():
+        return
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(render_variants, digest, path, VARIANT_WIDTHS): digest
+            for digest, path in images
+        }
+        for future in as_completed(futures):
+            digest = futures[future]
+            try:
+                yield digest, future.result()
+            except Exception as e:
+                print(f"Error generating variants for {digest}: {e}")
+                yield digest, []
+
+
+def pick_variant(variants, width, accepts_webp=False):
+    """
+    Choose the variant to serve for a requested width: the narrowest one at
+    least that wide, in WebP if the client accepts it. Returns None when the
+    original is the better fit (no variant is wide enough).
+    """
+    image_format = 'webp' if accepts_webp else 'jpeg'
+    candidates = [v for v in variants if v['format'] == image_format and v['width'] >= width]
+    if not candidates:
+        return None
+    return min(candidates, key=lambda v: v['width'])
+
+
+def remove_variants(paths):
+    """Delete variant files; returns the number removed"""
+    removed = 0
+    for path in paths:
+        try:
+            os.remove(os.path.join(os.getcwd(), path))
+            removed += 1
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"Error removing image variant {path}: {e}")
+    return removed
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Opaque cursors for keyset pagination.
+
+Articles are listed newest first, ordered by (scrape_timestamp, id). A
+cursor encodes the key of the last article on a page; the next page is
+everything strictly after it in that order, so fetching page N costs the
+same as page 1 however deep it is.
+"""
+import json
+import base64
+import binascii
+
+
+class InvalidCursor(ValueError):
+    """The cursor was not produced by this module"""
+
+
+def article_key(article):
+    """Sort key of an article: (scrape_timestamp, id)"""
+    return (article.get('scrape_timestamp') or '', article.get('id') or '')
+
+
+def _encode(value):
+    raw = json.dumps(value, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def _decode(cursor):
+    try:
+        return json.loads(base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)))
+    except (binascii.Error, ValueError) as e:
+        raise InvalidCursor(f"Invalid cursor: {cursor}") from e
+
+
+def encode_cursor(article):
+    """Opaque cursor pointing just after the given article"""
+    return _encode(list(article_key(article)))
+
+
+def next_page_cursor(articles, limit):
+    """
+    Cursor for the page after a full page of results, or None when there is
+    no next page (a short or empty page, or no limit)
+    """
+    if articles and limit is not None and len(articles) == limit:
+        return encode_cursor(articles[-1])
+    return None
+
+
+def decode_cursor(cursor):
+    """Return the (scrape_timestamp, id) key a cursor points after"""
+    value = _decode(cursor)
+    if not isinstance(value, list) or len(value) != 2 or not all(isinstance(v, str) for v in value):
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    return value[0], value[1]
+
+
+def encode_offset_cursor(offset):
+    """
+    Opaque cursor for results ranked by relevance. Ranking has to score every
+    match anyway, so there is no key to seek on and the cursor holds an offset.
+    """
+    return _encode({"offset": offset})
+
+
+def decode_offset_cursor(cursor):
+    """Return the offset held by a cursor from encode_offset_cursor"""
+    value = _decode(cursor)
+    if not isinstance(value, dict) or not isinstance(value.get("offset"), int) or value["offset"] < 0:
+        raise InvalidCursor(f"Invalid cursor: {cursor}")
+    return value["offset"]
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Pre-compressed copies of exported files.
+
+export_to_json writes gaming_news.json.gz and, when the brotli package is
+installed, gaming_news.json.br next to the export, so /json can send the
+bytes straight from disk in whichever encoding the client accepts instead
+of compressing (or re-serialising) them per request.
+"""
+import os
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+from atomic_files import atomic_write
+
+GZIP_LEVEL = 9
+BROTLI_QUALITY = int(os.environ.get('BROTLI_QUALITY', 9))
+
+# Content-Encoding -> file suffix, most preferred first
+SIBLINGS = (('br', '.br'), ('gzip', '.gz'))
+
+# Bytes read from the source file at a time
+CHUNK_SIZE = 1024 * 1024
+
+
+def _compress(encoding, source, f):
+    """Compress the open file source into the open file f a chunk at a time"""
+    chunks = iter(lambda: source.read(CHUNK_SIZE), b'')
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+        for chunk in chunks:
+            f.write(compressor.process(chunk))
+        f.write(compressor.finish())
+        return
+    # mtime=0 keeps the output identical for identical input
+    with gzip.GzipFile(filename='', mode='wb', compresslevel=GZIP_LEVEL, fileobj=f, mtime=0) as gz:
+        for chunk in chunks:
+            gz.write(chunk)
+
+
+def available_encodings():
+    """Encodings this installation can produce"""
+    return [encoding for encoding, _ in SIBLINGS if encoding != 'br' or brotli is not None]
+
+
+def write_siblings(path):
+    """
+    Write compressed copies of a file next to it, streaming it through each
+    encoder so memory stays flat however large it is; returns the encodings written
+    """
+    written = []
+    for encoding, suffix in SIBLINGS:
+        target = path + suffix
+        if encoding not in available_encodings():
+            # Don't leave a stale copy from an installation that had the encoder
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        try:
+            with open(path, 'rb') as source, atomic_write(target, 'wb') as f:
+                _compress(encoding, source, f)
+            written.append(encoding)
+        except Exception as e:
+            print(f"Error writing {target}: {e}")
+    return written
+
+
+def negotiate(path, accept_encodings):
+    """
+    Pick the copy of a file to send for a request
+
+    Args:
+        path (str): The uncompressed file
+        accept_encodings: The request's parsed Accept-Encoding (quality lookup by name)
+
+    Returns:
+        tuple: (file path, content encoding or None for the uncompressed file)
+    """
+    source_mtime = os.stat(path).st_mtime_ns
+    for encoding, suffix in SIBLINGS:
+        if not accept_encodings[encoding]:
+            continue
+        try:
+            # A copy older than the file was left behind by a writer that didn't refresh it
+            if os.stat(path + suffix).st_mtime_ns >= source_mtime:
+                return path + suffix, encoding
+        except FileNotFoundError:
+            continue
+    return path, None
@@ -2,6 +2,7 @@
 import os
 import sys
 import json
+import shutil
 import argparse
 import threading
 import queue
@@ -11,9 +12,16 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # Import utility functions
 from utils import save_to_json, download_image
+from atomic_files import atomic_write
+import http_client
+import image_queue
 
 # Import database module
-from database import NewsDatabase
+from database import NewsDatabase, ndjson_path
+import export_shards
+
+# Import the asyncio scraping engine
+from async_scraper import AsyncScrapeEngine
 
 # Import scrapers
 from scrapers.ign_scraper import IGNScraper
@@ -40,16 +48,27 @@ def clear_data(json_file, images_dir="images", content_dir="content"):
     }
     
     # Save empty JSON
-    with open(json_file, 'w', encoding='utf-8') as f:
+    with atomic_write(json_file) as f:
         json.dump(empty_data, f, ensure_ascii=False, indent=4)
     
-    # Clear images directory
+    # Empty the line-delimited export too
+    if os.path.exists(ndjson_path(json_file)):
+        with atomic_write(ndjson_path(json_file)) as f:
+            pass
+    
+    # Remove the per-source and per-day export shards
+    if os.path.exists(export_shards.EXPORTS_DIR):
+        shutil.rmtree(export_shards.EXPORTS_DIR)
+    
+    # Clear images directory, including the content-addressed store and its variants
     if os.path.exists(images_dir):
         for file in os.listdir(images_dir):
             file_path = os.path.join(images_dir, file)
             try:
                 if os.path.isfile(file_path):
                     os.unlink(file_path)
+                elif os.path.isdir(file_path) and file in ("store", "variants"):
+                    shutil.rmtree(file_path)
             except Exception as e:
                 print(f"Error deleting {file_path}: {e}")
     
@@ -73,6 +92,9 @@ def main():
     parser.add_argument('--clear', action='store_true', help='Clear existing JSON file and images before scraping (default: False)')
     parser.add_argument('--verbose', action='store_true', help='Show detailed debug information (default: False)')
     parser.add_argument('--db', action='store_true', help='Use SQLite database to store articles (default: False)')
+    parser.add_argument('--cache', action='store_true', help='Cache fetched pages on disk under http_cache/ (default: False)')
+    parser.add_argument('--replay', action='store_true', help='Serve every fetch from the on-disk cache without touching the network (default: False)')
+    parser.add_argument('--engine', type=str, choices=['threads', 'async'], default='threads', help='Scraping engine: one thread per site, or async with concurrent article fetches (default: threads)')
     args = parser.parse_args()
     
     # Clear existing data if requested and exit
@@ -104,6 +126,19 @@ def main():
     else:
         scrapers = all_scrapers
     
+    # One retry budget for the whole run
+    http_client.reset_retry_budget()
+    
+    if args.cache or args.replay:
+        http_client.configure_response_cache(enabled=True, replay=args.replay)
+        if args.replay:
+            print("Replay mode: serving all pages from the response cache")
+    
+    # When storing in the database, skip article pages we already have
+    # (except in replay mode, where the point is to re-parse cached pages)
+    db = NewsDatabase() if args.db else None
+    url_filter = db.filter_new_urls if db and not args.replay else None
+    
     print(f"Starting to scrape {len(scrapers)} gaming news websites...")
     print(f"Articles per site: {args.limit}")
     
@@ -114,9 +149,9 @@ def main():
     def scrape_site(name, scraper, limit):
         try:
             # No need to print starting message - will be shown in progress bar
-            articles = scraper.scrape(limit)
+            articles = scraper.scrape(limit, url_filter=url_filter)
             results_queue.put((name, articles))
-            return name, len(articles)
+            return name, articles
         except Exception as e:
             import traceback
             print(f"\n[ERROR] {name}: {e}")
@@ -124,33 +159,64 @@ def main():
             if '--verbose' in sys.argv:
                 traceback.print_exc()
             results_queue.put((name, []))
-            return name, 0
+            return name, []
     
     print(f"Starting scraping with {len(scrapers)} sources...")
     
+    # Download images in the background so parsing isn't held up by image bandwidth
+    # (replay mode has no images to fetch, so the queue is left unattached)
+    downloads = image_queue.ImageDownloadQueue()
+    if not args.replay:
+        for scraper in scrapers.values():
+            scraper.image_queue = downloads
+    
+    # In database mode each source's articles are stored as soon as that source
+    # finishes, with pending images that are filled in as their downloads land
+    new_articles_count = 0
+    def store_articles(articles):
+        nonlocal new_articles_count
+        if db and articles:
+            new_articles_count += db.add_articles(articles)
+    if db and not args.replay:
+        downloads.add_listener(lambda article: db.update_article_image(
+            article['source_url'], article['local_image_path'], article['image_status']))
+    
     # Create a progress bar for overall scraping progress
     progress_bar = tqdm(total=len(scrapers), desc="Overall progress", position=0)
     site_status = {name: "Pending" for name in scrapers.keys()}
     
-    # Use ThreadPoolExecutor to run scrapers in parallel
-    with ThreadPoolExecutor(max_workers=len(scrapers)) as executor:
-        # Submit all scraping tasks
-        future_to_site = {executor.submit(scrape_site, name, scraper, args.limit): name 
-                         for name, scraper in scrapers.items()}
+    if args.engine == 'async':
+        def on_source_done(name, articles):
+            results_queue.put((name, articles))
+            store_articles(articles)
+            site_status[name] = f"[OK] {len(articles)} articles"
+            status_str = ", ".join([f"{site}: {status}" for site, status in site_status.items()])
+            progress_bar.set_description(f"Progress: {status_str}")
+            progress_bar.update(1)
         
-        # Process results as they complete
-        for future in as_completed(future_to_site):
-            site_name = future_to_site[future]
-            try:
-                name, count = future.result()
-                site_status[name] = f"[OK] {count} articles"
-                # Update progress bar description to show current status
-                status_str = ", ".join([f"{site}: {status}" for site, status in site_status.items()])
-                progress_bar.set_description(f"Progress: {status_str}")
-                progress_bar.update(1)
-            except Exception as e:
-                site_status[site_name] = f"[FAILED]"
-                progress_bar.update(1)
+        # Fetch article pages from every site concurrently on one event loop
+        AsyncScrapeEngine().run(scrapers, args.limit, on_source_done=on_source_done, url_filter=url_filter)
+    else:
+        # Use ThreadPoolExecutor to run scrapers in parallel
+        with ThreadPoolExecutor(max_workers=len(scrapers)) as executor:
+            # Submit all scraping tasks
+            future_to_site = {executor.submit(scrape_site, name, scraper, args.limit): name 
+                             for name, scraper in scrapers.items()}
+            
+            # Process results as they complete
+            for future in as_completed(future_to_site):
+                site_name = future_to_site[future]
+                try:
+                    name, articles = future.result()
+                    store_articles(articles)
+                    site_status[name] = f"[OK] {len(articles)} articles"
+                    # Update progress bar description to show current status
+                    status_str = ", ".join([f"{site}: {status}" for site, status in site_status.items()])
+                    progress_bar.set_description(f"Progress: {status_str}")
+                    progress_bar.update(1)
+                except Exception as e:
+                    site_status[site_name] = f"[FAILED]"
+                    progress_bar.update(1)
     
     progress_bar.close()
     
@@ -160,11 +226,16 @@ def main():
         if articles:
             all_articles.extend(articles)
     
+    # Wait for the background image downloads to fill in local paths
+    print("Waiting for image downloads to finish...")
+    downloads.join()
+    downloads.shutdown()
+    
     # Post-process articles to fix any issues
     fixed_count = 0
     for article in all_articles:
         # Fix GameRant articles with missing or problematic images
-        if article.get('source_name') == 'GameRant' and (not article.get('image_url') or 
+        if not args.replay and article.get('source_name') == 'GameRant' and (not article.get('image_url') or 
                                                        'logo' in article.get('image_url', '').lower() or 
                                                        'svg' in article.get('image_url', '').lower() or
                                                        'author' in article.get('image_url', '').lower() or
@@ -217,9 +288,15 @@ def main():
     
     # Save articles to database if --db flag is used, otherwise save to JSON
     if args.db:
-        # Initialize database connection
-        db = NewsDatabase()
-        new_articles_count = db.add_articles(all_articles)
+        # Rows were stored as each source finished; record the image results
+        # and the fixes above, and store anything that wasn't stored yet.
+        # A replay downloaded no images, so it must not touch the stored ones
+        new_articles_count += db.upsert_articles(all_articles, update_existing=True,
+                                                 update_images=not args.replay)['inserted']
+        if not args.replay:
+            db.update_article_images(all_articles)
+            db.collect_image_garbage()
+            db.generate_image_variants()
         
         # Also export to JSON for compatibility
         if args.output:
@@ -2,7 +2,8 @@ from abc import ABC, abstractmethod
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import get_soup, create_article_object
+import http_client
+from utils import get_soup, create_article_object, NOT_MODIFIED
 
 class BaseScraper(ABC):
     """
@@ -11,6 +12,43 @@ class BaseScraper(ABC):
     def __init__(self, base_url, name=None):
         self.base_url = base_url
         self.name = name or self._extract_name_from_url(base_url)
+        # Background queue (image_queue.ImageDownloadQueue) for this scraper's
+        # image downloads, set by the run; None downloads images inline
+        self.image_queue = None
+        self.reset_run_state()
+    
+    def reset_run_state(self):
+        """Clear the per-run bookkeeping before a new scrape"""
+        # Number of article URLs skipped by the last scrape because they were already stored
+        self.skipped_urls = 0
+        # True when the listing page answered 304 Not Modified on the last scrape
+        self.listing_not_modified = False
+        # Last listing page fetched in full, whose validators are committed after a successful scrape
+        self._listing_url = None
+    
+    def get_listing_soup(self, url, headers=None):
+        """
+        Fetch a listing page with a conditional GET
+        
+        Returns:
+            BeautifulSoup, NOT_MODIFIED if the page is unchanged since the last successful run, or None
+        """
+        soup = get_soup(url, headers=headers, conditional=True)
+        if soup is NOT_MODIFIED:
+            print(f"{self.name} listing unchanged since last run: {url}")
+            self.listing_not_modified = True
+        elif soup:
+            if self._listing_url and self._listing_url != url:
+                # An earlier path in a fallback loop didn't pan out
+                http_client.validator_cache.discard(self._listing_url)
+            self._listing_url = url
+        return soup
+    
+    def commit_listing_validators(self):
+        """Persist the validators of the listing page that produced this run's articles"""
+        if self._listing_url:
+            http_client.validator_cache.commit(self._listing_url)
+            self._listing_url = None
     
     def _extract_name_from_url(self, url):
         """Extract a name from the URL"""
@@ -53,27 +91,54 @@ class BaseScraper(ABC):
         """
         pass
     
-    def scrape(self, limit=10):
+    def filter_article_urls(self, article_urls, url_filter=None):
+        """
+        Drop article URLs that were already scraped before fetching them
+        
+        Args:
+            article_urls (list): Candidate article URLs
+            url_filter (callable or None): Takes a list of URLs and returns the unseen ones
+            
+        Returns:
+            list: Article URLs that still need to be scraped
+        """
+        self.skipped_urls = 0
+        if not url_filter or not article_urls:
+            return article_urls
+        
+        new_urls = url_filter(article_urls)
+        self.skipped_urls = len(article_urls) - len(new_urls)
+        if self.skipped_urls:
+            print(f"Skipping {self.skipped_urls} already stored articles on {self.name}")
+        return new_urls
+    
+    def scrape(self, limit=10, url_filter=None):
         """
         Scrape articles from the website
         
         Args:
             limit (int or None): Maximum number of articles to scrape, None for unlimited
+            url_filter (callable or None): Takes a list of URLs and returns the ones not yet stored
             
         Returns:
             list: List of article data
         """
         print(f"Scraping {self.name}...")
+        self.reset_run_state()
         
         # Get article URLs - handle None limit case
         article_urls = self.get_article_urls(limit)
         
         if not article_urls:
-            print(f"No articles found on {self.name}")
+            if not self.listing_not_modified:
+                print(f"No articles found on {self.name}")
             return []
         
         print(f"Found {len(article_urls)} articles on {self.name}")
         
+        # Only fetch articles we don't already have
+        article_urls = self.filter_article_urls(article_urls, url_filter)
+        
         # Scrape each article
         articles = []
         for i, url in enumerate(article_urls):
@@ -86,4 +151,8 @@ class BaseScraper(ABC):
                 print(f"  Error scraping article {url}: {e}")
         
         print(f"Successfully scraped {len(articles)} articles from {self.name}")
+        
+        # Next run can send a conditional GET for the listing page that worked
+        if articles or self.skipped_urls:
+            self.commit_listing_validators()
         return articles
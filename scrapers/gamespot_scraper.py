@@ -1,7 +1,7 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import get_soup, create_article_object, clean_text, is_valid_title, is_valid_image_url
+from utils import get_soup, NOT_MODIFIED, create_article_object, clean_text, is_valid_title, is_valid_image_url
 from scrapers.base_scraper import BaseScraper
 
 class GameSpotScraper(BaseScraper):
@@ -9,8 +9,8 @@ class GameSpotScraper(BaseScraper):
         super().__init__("https://www.gamespot.com", "GameSpot")
     
     def get_article_urls(self, limit=10):
-        soup = get_soup(f"{self.base_url}/news")
-        if not soup:
+        soup = self.get_listing_soup(f"{self.base_url}/news")
+        if soup is NOT_MODIFIED or not soup:
             return []
         
         article_links = []
@@ -105,4 +105,4 @@ class GameSpotScraper(BaseScraper):
             print(f"Skipping invalid article from {self.name}: {url} - Invalid title or image")
             return None
             
-        return create_article_object(title, image_url, content, url, self.name)
+        return create_article_object(title, image_url, content, url, self.name, self.image_queue)
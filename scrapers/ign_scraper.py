@@ -1,7 +1,7 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import get_soup, create_article_object, clean_text
+from utils import get_soup, NOT_MODIFIED, create_article_object, clean_text
 from scrapers.base_scraper import BaseScraper
 
 class IGNScraper(BaseScraper):
@@ -9,8 +9,8 @@ class IGNScraper(BaseScraper):
         super().__init__("https://www.ign.com", "IGN")
     
     def get_article_urls(self, limit=10):
-        soup = get_soup(f"{self.base_url}/news")
-        if not soup:
+        soup = self.get_listing_soup(f"{self.base_url}/news")
+        if soup is NOT_MODIFIED or not soup:
             return []
         
         article_links = []
@@ -85,4 +85,4 @@ class IGNScraper(BaseScraper):
         else:
             content = ""
         
-        return create_article_object(title, image_url, content, url, self.name)
+        return create_article_object(title, image_url, content, url, self.name, self.image_queue)
@@ -1,7 +1,7 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import get_soup, create_article_object, clean_text, is_valid_title, is_valid_image_url
+from utils import get_soup, NOT_MODIFIED, create_article_object, clean_text, is_valid_title, is_valid_image_url
 from scrapers.base_scraper import BaseScraper
 
 class KotakuScraper(BaseScraper):
@@ -9,8 +9,8 @@ class KotakuScraper(BaseScraper):
         super().__init__("https://kotaku.com", "Kotaku")
     
     def get_article_urls(self, limit=10):
-        soup = get_soup(self.base_url)
-        if not soup:
+        soup = self.get_listing_soup(self.base_url)
+        if soup is NOT_MODIFIED or not soup:
             return []
         
         article_links = []
@@ -66,4 +66,4 @@ class KotakuScraper(BaseScraper):
         # Validate title and image_url
         if not is_valid_title(title) or not is_valid_image_url(image_url):
             return None
-        return create_article_object(title, image_url, content, url, self.name)
+        return create_article_object(title, image_url, content, url, self.name, self.image_queue)
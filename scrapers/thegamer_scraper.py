@@ -1,7 +1,7 @@
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from utils import get_soup, create_article_object, clean_text, is_valid_title, is_valid_image_url
+from utils import get_soup, NOT_MODIFIED, create_article_object, clean_text, is_valid_title, is_valid_image_url
 from scrapers.base_scraper import BaseScraper
 
 class TheGamerScraper(BaseScraper):
@@ -17,14 +17,17 @@ class TheGamerScraper(BaseScraper):
         for path in paths:
             try:
                 print(f"Trying to access TheGamer at {self.base_url}{path}")
-                soup = get_soup(f"{self.base_url}{path}", 
-                               headers={
-                                   'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
-                                   'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
-                                   'Accept-Language': 'en-US,en;q=0.9',
-                                   'Cache-Control': 'max-age=0',
-                                   'Connection': 'keep-alive'
-                               })
+                soup = self.get_listing_soup(f"{self.base_url}{path}", 
+                                           headers={
+                                               'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36',
+                                               'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8',
+                                               'Accept-Language': 'en-US,en;q=0.9',
+                                               'Cache-Control': 'max-age=0',
+                                               'Connection': 'keep-alive'
+                                           })
+                
+                if soup is NOT_MODIFIED:
+                    return []
                 
                 if not soup:
                     continue
@@ -247,7 +250,7 @@ class TheGamerScraper(BaseScraper):
                 print(f"Skipping invalid article from {self.name}: {url} - Invalid title or image")
                 return None
                 
-            return create_article_object(title, image_url, content, url, self.name)
+            return create_article_object(title, image_url, content, url, self.name, self.image_queue)
             
         except Exception as e:
             import traceback
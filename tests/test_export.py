@@ -0,0 +1,103 @@
+import os
+import re
+
+import pytest
+
+from database import NewsDatabase, ndjson_path
+
+
+@pytest.fixture
+def db(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return NewsDatabase(str(tmp_path / "news.db"))
+
+
+def add_articles(db, start, count, source="IGN"):
+    articles = [{"title": f"Article {i}", "content": f"Body {i}", "source_name": source,
+                 "source_url": f"https://example.com/{source}/{i}", "image_url": ""}
+                for i in range(start, start + count)]
+    db.add_articles(articles)
+    # Later articles are newer, so each batch sorts in front of the last one
+    conn = db.connect()
+    for i in range(start, start + count):
+        conn.execute("UPDATE articles SET scrape_timestamp = ? WHERE source_url = ?",
+                     (f"2024-01-01 00:{i // 60:02d}:{i % 60:02d}", f"https://example.com/{source}/{i}"))
+    conn.commit()
+
+
+def exports_since_compaction(db, output_file):
+    return db.connect().execute("SELECT exports_since_compaction FROM export_state WHERE filename = ?",
+                                (output_file,)).fetchone()[0]
+
+
+def read_body(path):
+    """Export file contents without the header fields that differ between exports"""
+    with open(path, "rb") as f:
+        data = f.read()
+    return re.sub(rb'    "(scrape_timestamp|export_generation)": [^\n]*\n', b"", data)
+
+
+def assert_matches_full_export(db, output_file):
+    assert db.export_to_json("full.json", full=True) == db.get_article_count()
+    assert read_body(output_file) == read_body("full.json")
+    with open(ndjson_path(output_file), "rb") as f, open(ndjson_path("full.json"), "rb") as expected:
+        assert f.read() == expected.read()
+
+
+def test_incremental_export_matches_full_export(db):
+    add_articles(db, 0, 3)
+    assert db.export_to_json("news.json") == 3
+    assert exports_since_compaction(db, "news.json") == 0
+    add_articles(db, 3, 2)
+    add_articles(db, 5, 2, source="PC Gamer")
+    assert db.export_to_json("news.json") == 7
+    assert exports_since_compaction(db, "news.json") == 1
+    assert_matches_full_export(db, "news.json")
+
+
+def test_incremental_export_from_empty_list(db):
+    assert db.export_to_json("news.json") == 0
+    with open("news.json", "rb") as f:
+        assert f.read().endswith(b'"articles": []\n}')
+    add_articles(db, 0, 2)
+    assert db.export_to_json("news.json") == 2
+    assert exports_since_compaction(db, "news.json") == 1
+    assert_matches_full_export(db, "news.json")
+
+
+def test_export_rewrites_file_replaced_by_another_writer(db):
+    add_articles(db, 0, 2)
+    db.export_to_json("news.json")
+    with open("news.json", "w", encoding="utf-8") as f:
+        f.write('{"articles": []}')
+    add_articles(db, 2, 1)
+    assert db.export_to_json("news.json") == 3
+    assert exports_since_compaction(db, "news.json") == 0
+    assert_matches_full_export(db, "news.json")
+
+
+def test_export_without_new_articles_leaves_files_alone(db):
+    add_articles(db, 0, 2)
+    db.export_to_json("news.json")
+    generation = db.export_generation
+    stat = os.stat("news.json")
+    history = db.connect().execute("SELECT COUNT(*) FROM export_history").fetchone()[0]
+
+    assert db.export_to_json("news.json") == 2
+    assert os.stat("news.json").st_mtime_ns == stat.st_mtime_ns
+    assert db.export_generation == generation
+    assert db.connect().execute("SELECT COUNT(*) FROM export_history").fetchone()[0] == history
+
+
+def test_spliced_source_shard_matches_rebuilt_shard(db):
+    add_articles(db, 0, 2)
+    db.export_to_json("news.json")
+    add_articles(db, 2, 2)
+    db.export_to_json("news.json")
+    with open(os.path.join("exports", "sources", "ign.json"), "rb") as f:
+        spliced = f.read()
+
+    # A full rebuild produces the same bytes, so no shard is rewritten
+    assert db.export_shards() == 0
+    with open(os.path.join("exports", "sources", "ign.json"), "rb") as f:
+        assert f.read() == spliced
@@ -0,0 +1,55 @@
+import os
+import time
+import threading
+
+import requests
+from http_client import HostLimiter, ResponseCache
+
+
+def test_cached_response_can_be_closed_and_iterated(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), enabled=True)
+    fetched = requests.Response()
+    fetched.status_code = 200
+    fetched.headers['Content-Type'] = 'text/html'
+    fetched._content = b'<html>cached page</html>'
+    cache.put('https://example.com/news', fetched)
+
+    with cache.get('https://example.com/news') as response:
+        assert response.status_code == 200
+        assert b''.join(response.iter_content(chunk_size=4)) == b'<html>cached page</html>'
+        assert response.text == '<html>cached page</html>'
+    response.close()
+
+
+def test_cache_miss_returns_none(tmp_path):
+    cache = ResponseCache(cache_dir=str(tmp_path), enabled=True)
+    assert cache.get('https://example.com/missing') is None
+
+
+def test_throttled_host_does_not_hold_slots():
+    limiter = HostLimiter('example.com', rate=0, max_in_flight=1, slot_timeout=0.1)
+    limiter._blocked_until = time.monotonic() + 0.3
+    waiter = threading.Thread(target=limiter.acquire)
+    waiter.start()
+    time.sleep(0.1)
+
+    # The waiting thread sits out the pause without taking the only slot
+    assert limiter._in_flight.acquire(blocking=False)
+    limiter.release()
+    waiter.join()
+    limiter.release()
+
+
+def test_failed_cache_write_leaves_no_temp_file(tmp_path):
+    class BrokenResponse(requests.Response):
+        @property
+        def content(self):
+            raise OSError("connection dropped")
+
+    cache = ResponseCache(cache_dir=str(tmp_path), enabled=True)
+    fetched = BrokenResponse()
+    fetched.status_code = 200
+    cache.put('https://example.com/news', fetched)
+
+    assert cache.get('https://example.com/news') is None
+    assert [name for _, _, files in os.walk(tmp_path) for name in files] == []
@@ -0,0 +1,28 @@
+from article_snapshot import Snapshot
+from pagination import decode_cursor, next_page_cursor
+
+
+def make_articles(count):
+    return [{"id": f"id-{i:02d}", "title": f"Article {i}", "source_name": "IGN",
+             "scrape_timestamp": f"2024-01-01 00:00:{i:02d}"} for i in range(count)]
+
+
+def test_next_page_cursor_limit_zero():
+    assert next_page_cursor([], 0) is None
+
+
+def test_next_page_cursor_empty_result():
+    assert next_page_cursor([], 10) is None
+    assert next_page_cursor([], None) is None
+
+
+def test_next_page_cursor_full_and_short_pages():
+    articles = make_articles(3)
+    assert decode_cursor(next_page_cursor(articles, 3)) == ("2024-01-01 00:00:02", "id-02")
+    assert next_page_cursor(articles, 5) is None
+
+
+def test_snapshot_page_limit_zero_and_empty_source():
+    snapshot = Snapshot({"articles": make_articles(3)}, None, 0)
+    assert snapshot.page(limit=0) == ([], 3, None)
+    assert snapshot.page(source="Nobody", limit=10) == ([], 0, None)
@@ -2,24 +2,43 @@ import os
 import json
 import requests
 import uuid
+import http_client
+import image_queue
+import image_store
+import image_sniff
+from atomic_files import atomic_write
 from bs4 import BeautifulSoup
 from datetime import datetime
 from urllib.parse import urlparse
 
-def get_soup(url, headers=None):
+# Returned by get_soup(conditional=True) when the server answers 304 Not Modified
+NOT_MODIFIED = object()
+
+def get_soup(url, headers=None, conditional=False):
     """
     Fetch a webpage and return a BeautifulSoup object
+    
+    With conditional=True the request carries If-None-Match / If-Modified-Since
+    from the validator cache, NOT_MODIFIED is returned on a 304, and the
+    validators of a fresh response are staged until
+    http_client.validator_cache.commit(url) is called.
     """
-    default_headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36'
-    }
+    default_headers = dict(http_client.DEFAULT_HEADERS)
     
     if headers:
         default_headers.update(headers)
     
+    if conditional:
+        default_headers.update(http_client.validator_cache.conditional_headers(url))
+    
     try:
-        response = requests.get(url, headers=default_headers, timeout=10)
+        # Reuse the pooled keep-alive session for this host
+        response = http_client.fetch(url, headers=default_headers, cache=True)
+        if conditional and response.status_code == 304:
+            return NOT_MODIFIED
         response.raise_for_status()
+        if conditional:
+            http_client.validator_cache.stage(url, response)
         return BeautifulSoup(response.content, 'lxml')
     except requests.exceptions.RequestException as e:
         print(f"Error fetching {url}: {e}")
@@ -67,16 +86,16 @@ def save_to_json(data, filename="gaming_news.json"):
         "articles": combined_articles
     }
     
-    # Save to file
+    # Save to file; readers see the old or the new file, never a partial one
     try:
-        with open(filename, 'w', encoding='utf-8') as f:
+        with atomic_write(filename) as f:
             # Use ensure_ascii=False to preserve Unicode characters
             # Use default escaping for special characters
             json.dump(output, f, ensure_ascii=False, indent=4)
     except Exception as e:
         print(f"Error saving JSON: {e}")
         # Fallback: Try to save with more aggressive encoding settings
-        with open(filename, 'w', encoding='utf-8') as f:
+        with atomic_write(filename) as f:
             json.dump(output, f, ensure_ascii=True, indent=4)
     
     print(f"Saved {len(combined_articles)} articles to {filename} ({len(new_articles)} new articles added)")
@@ -152,7 +171,7 @@ def download_image(image_url, source_name, article_title, article_id=None):
     - image_url: URL of the image to download
     - source_name: Name of the source website
     - article_title: Title of the article
-    - article_id: Unique ID of the article (if provided, will be used for the filename)
+    - article_id: Unique ID of the article (files are named by content hash, not by article)
     """
     if not image_url:
         return ""
@@ -188,80 +207,74 @@ def download_image(image_url, source_name, article_title, article_id=None):
         print(f"Skipping GameRant logo: {image_url}")
         return find_fallback_image(source_name, article_title, article_id)
     
-    # Create images directory if it doesn't exist
-    images_dir = os.path.join(os.getcwd(), "images")
-    if not os.path.exists(images_dir):
-        os.makedirs(images_dir)
-    
     # Get file extension from URL or default to .jpg
     extension = os.path.splitext(path)[1].lower()
     if not extension or len(extension) > 5 or extension not in ('.jpg', '.jpeg', '.png', '.gif', '.webp'):
         extension = ".jpg"
     
-    # Use the provided article_id if available, otherwise generate a new one
-    if article_id:
-        filename = f"{article_id}{extension}"
-    else:
-        # Create a unique filename using UUID and date if no article_id provided
-        unique_id = str(uuid.uuid4())[:8]  # Use first 8 chars of UUID for brevity
-        timestamp = datetime.now().strftime("%Y%m%d")
-        filename = f"{timestamp}_{unique_id}{extension}"
-    filepath = os.path.join(images_dir, filename)
+    # Images are stored by content hash, so articles sharing an image share one file.
+    # The response (and its host's in-flight slot) is released before falling
+    # back, since fallback images live on the same hosts as article images
+    stored_path = _download_to_store(image_url, extension)
+    if stored_path:
+        # Return the GitHub-friendly path to the image (using forward slashes)
+        # This will work correctly when hosted on GitHub
+        return stored_path
     
+    # Try to find a fallback image based on the article title
+    print(f"Searching for fallback image: {source_name} {article_title} gaming news")
+    return find_fallback_image(source_name, article_title, article_id)
+
+
+def _download_to_store(image_url, extension):
+    """
+    Stream an image into the content-addressed store.
+    Returns the stored path, or an empty string if the image was rejected or failed.
+    """
+    temp_path = None
+    response = None
     try:
         # Download the image
-        response = requests.get(image_url, stream=True, timeout=10)
+        response = http_client.fetch(image_url, stream=True)
         response.raise_for_status()
         
         # Check if the content is an image and not SVG
         content_type = response.headers.get('Content-Type', '')
         if not content_type.startswith('image/') or content_type == 'image/svg+xml':
             print(f"Content is not a supported image format: {content_type} for URL {image_url}")
-            return find_fallback_image(source_name, article_title)
+            return ""
         
-        # Additional check: read first few bytes to verify it's an image file
-        first_bytes = next(response.iter_content(256))
-        # Check for common image file signatures
-        is_image = False
-        # JPEG signature
-        if first_bytes.startswith(b'\xff\xd8'):
-            is_image = True
-        # PNG signature
-        elif first_bytes.startswith(b'\x89PNG\r\n\x1a\n'):
-            is_image = True
-        # GIF signature
-        elif first_bytes.startswith((b'GIF87a', b'GIF89a')):
-            is_image = True
-        # WEBP signature (usually starts with RIFF....WEBP)
-        elif b'WEBP' in first_bytes[:20]:
-            is_image = True
-            
-        if not is_image:
-            print(f"File does not appear to be a valid image: {image_url}")
-            return find_fallback_image(source_name, article_title)
+        # A declared length over the cap can be rejected before reading anything
+        declared_size = response.headers.get('Content-Length')
+        if declared_size and declared_size.isdigit() and int(declared_size) > image_sniff.MAX_IMAGE_BYTES:
+            print(f"Image is too large ({declared_size} bytes): {image_url}")
+            return ""
         
-        # Check if the image is too small (likely an icon or logo)
-        img_size = int(response.headers.get('Content-Length', 0))
-        if img_size < 5000:  # Less than 5KB is probably too small
-            print(f"Image is too small ({img_size} bytes): {image_url}")
-            # Try to find a fallback image based on the article title
-            print(f"Searching for fallback image: {source_name} {article_title} gaming news")
-            return find_fallback_image(source_name, article_title)
-        
-        # Save the image
-        with open(filepath, 'wb') as f:
-            f.write(first_bytes)  # Write the first chunk we already read
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
+        # Stream to a temp file while checking the magic bytes, the real
+        # dimensions and the actual byte count (Content-Length is often
+        # missing on chunked responses, so it can't be trusted)
+        temp_path = image_store.new_temp_path("image")
+        try:
+            image_info = image_sniff.save_stream(response.iter_content(chunk_size=8192), temp_path)
+        except image_sniff.InvalidImage as e:
+            print(f"Rejected image {image_url}: {e}")
+            return ""
         
-        # Return the GitHub-friendly path to the image (using forward slashes)
-        # This will work correctly when hosted on GitHub
-        github_path = f"images/{filename}"
-        return github_path
+        # Name the file after what it really is, then move it into the store under its hash
+        extension = image_sniff.EXTENSIONS.get(image_info["format"], extension)
+        stored_path = image_store.store_file(temp_path, extension)
+        temp_path = None
+        return stored_path
     
     except Exception as e:
         print(f"Error downloading image from {image_url}: {e}")
-        return find_fallback_image(source_name, article_title, article_id)
+        return ""
+    finally:
+        # Hand the connection back to the pool even if we bailed out early
+        if response is not None:
+            response.close()
+        if temp_path and os.path.exists(temp_path):
+            os.remove(temp_path)
 
 
 def find_fallback_image(source_name, article_title, article_id=None):
@@ -325,45 +338,17 @@ def find_fallback_image(source_name, article_title, article_id=None):
 
 def download_fallback_image(image_url, source_name, article_id=None):
     """
-    Download a fallback image and save it
-    Similar to download_image but simplified for fallbacks
+    Return the local path of a fallback image
+    Fallback images are shared by many articles, so each one is downloaded
+    once into the content-addressed image store and every article references
+    the same stored file
     
     Parameters:
     - image_url: URL of the fallback image
     - source_name: Name of the source website
-    - article_id: Unique ID of the article (if provided, will be used for the filename)
+    - article_id: Unique ID of the article (kept for compatibility; the stored file is shared)
     """
-    try:
-        # Create images directory if it doesn't exist
-        images_dir = os.path.join(os.getcwd(), "images")
-        if not os.path.exists(images_dir):
-            os.makedirs(images_dir)
-        
-        # Use the provided article_id if available, otherwise generate a new one
-        if article_id:
-            filename = f"{article_id}.jpg"
-        else:
-            # Create a unique filename if no article_id provided
-            unique_id = str(uuid.uuid4())[:8]
-            timestamp = datetime.now().strftime("%Y%m%d")
-            filename = f"{timestamp}_{unique_id}_fallback.jpg"
-            
-        filepath = os.path.join(images_dir, filename)
-        
-        # Download the image
-        response = requests.get(image_url, stream=True, timeout=10)
-        response.raise_for_status()
-        
-        with open(filepath, 'wb') as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                f.write(chunk)
-        
-        # Return the GitHub-friendly path
-        return f"images/{filename}"
-        
-    except Exception as e:
-        print(f"Error downloading fallback image: {e}")
-        return ""
+    return image_store.get_fallback_asset(image_url)
 
 def save_content_to_txt(article_id, content):
     """
@@ -378,18 +363,20 @@ def save_content_to_txt(article_id, content):
     filename = f"{article_id}.txt"
     file_path = os.path.join(content_dir, filename)
     
-    # Save content to file
+    # Save content to file; one of many small files, so the directory isn't fsynced per write
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
+        with atomic_write(file_path, durable=False) as f:
             f.write(content)
         return f"content/{filename}"
     except Exception as e:
         print(f"Error saving content to TXT file: {e}")
         return ""
 
-def create_article_object(title, image_url, content, source_url, source_name=None):
+def create_article_object(title, image_url, content, source_url, source_name=None, download_queue=None):
     """
-    Create a standardized article object with GitHub-compatible paths and unique ID
+    Create a standardized article object with GitHub-compatible paths and unique ID.
+    With a download_queue (image_queue.ImageDownloadQueue) the image is
+    downloaded in the background and the article comes back pending.
     """
     # Clean the title and content
     cleaned_title = clean_text(title)
@@ -430,8 +417,18 @@ def create_article_object(title, image_url, content, source_url, source_name=Non
     # Save content to TXT file and get the path
     content_file_path = save_content_to_txt(article_id, cleaned_content)
     
-    # Download the image with the article ID
-    local_image_path = download_image(image_url, source_name, cleaned_title, article_id)
+    # Download the image with the article ID, or hand it to the background
+    # queue so parsing can move on while the image streams to disk. Replay
+    # mode only has the cached pages, so images are not fetched at all
+    if download_queue and image_url:
+        local_image_path = ""
+        image_status = image_queue.PENDING
+    elif http_client.response_cache.replay:
+        local_image_path = ""
+        image_status = image_queue.FAILED
+    else:
+        local_image_path = download_image(image_url, source_name, cleaned_title, article_id)
+        image_status = image_queue.READY if local_image_path else image_queue.FAILED
     
     # Create GitHub repo URL for the image
     github_image_url = ""
@@ -444,15 +441,21 @@ def create_article_object(title, image_url, content, source_url, source_name=Non
     if content_file_path:
         github_content_url = f"https://raw.githubusercontent.com/solariscodes/newsrepo/master/{content_file_path}"
     
-    return {
+    article = {
         "id": article_id,
         "title": cleaned_title,
         "image_url": image_url,
         "local_image_path": local_image_path,
         "github_image_url": github_image_url,
+        "image_status": image_status,
         "content_file_path": content_file_path,
         "github_content_url": github_content_url,
         "source_url": source_url,
         "source_name": source_name,
         "scraped_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
     }
+    
+    if image_status == image_queue.PENDING:
+        download_queue.submit(article)
+    
+    return article